@@ -1,26 +1,52 @@
-from django.contrib import admin
-from .models import DifficultyLevel, Term, RuleTheory, Problem, TestQuestion, UserProgress
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from . import bulk
+from .catalog import bump_version
+from .models import DifficultyLevel, Term, RuleTheory, Problem, TestQuestion, UserProgress, PlacementSubmission, SiteCounter
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists for tables that grow with the number of learners or items"""
+    paginator = EstimatedCountPaginator
+    # Skip the second COUNT(*) of the whole table on filtered lists
+    show_full_result_count = False
+    # Newest first, as changelists do anyway; autocomplete pages need an order too
+    ordering = ('-id',)
 
 @admin.register(DifficultyLevel)
 class DifficultyLevelAdmin(admin.ModelAdmin):
-    list_display = ('level', 'name')
+    list_display = ('level', 'name', 'term_count', 'rule_count', 'problem_count')
     ordering = ('level',)
+    readonly_fields = ('term_count', 'rule_count', 'problem_count')
+    actions = ['refresh_catalog']
+    
+    @admin.action(description='Refresh cached content of selected levels')
+    def refresh_catalog(self, request, queryset):
+        # For edits made outside the admin/ORM, e.g. raw SQL
+        for level_id in queryset.values_list('id', flat=True):
+            bump_version(level_id)
+        self.message_user(request, f"Refreshed {queryset.count()} level(s).")
 
 @admin.register(Term)
-class TermAdmin(admin.ModelAdmin):
+class TermAdmin(LargeTableAdmin):
     list_display = ('title', 'difficulty')
+    list_select_related = ('difficulty',)
     list_filter = ('difficulty',)
     search_fields = ('title', 'explanation')
 
 @admin.register(RuleTheory)
-class RuleTheoryAdmin(admin.ModelAdmin):
+class RuleTheoryAdmin(LargeTableAdmin):
     list_display = ('title', 'difficulty')
+    list_select_related = ('difficulty',)
     list_filter = ('difficulty',)
     search_fields = ('title', 'explanation')
 
 @admin.register(Problem)
-class ProblemAdmin(admin.ModelAdmin):
+class ProblemAdmin(LargeTableAdmin):
     list_display = ('question_short', 'difficulty')
+    list_select_related = ('difficulty',)
     list_filter = ('difficulty',)
     search_fields = ('question', 'explanation')
     
@@ -31,6 +57,7 @@ class ProblemAdmin(admin.ModelAdmin):
 @admin.register(TestQuestion)
 class TestQuestionAdmin(admin.ModelAdmin):
     list_display = ('question_short', 'difficulty')
+    list_select_related = ('difficulty',)
     list_filter = ('difficulty',)
     search_fields = ('question', 'explanation')
     
@@ -38,8 +65,49 @@ class TestQuestionAdmin(admin.ModelAdmin):
         return obj.question[:50] + "..." if len(obj.question) > 50 else obj.question
     question_short.short_description = 'Question'
 
+class UserProgressActionForm(ActionForm):
+    level = forms.ModelChoiceField(
+        DifficultyLevel.objects.order_by('level'), required=False, empty_label='Level (for "set level")'
+    )
+
 @admin.register(UserProgress)
-class UserProgressAdmin(admin.ModelAdmin):
+class UserProgressAdmin(LargeTableAdmin):
     list_display = ('user', 'current_level', 'placement_test_taken', 'placement_test_score')
+    list_select_related = ('user', 'current_level')
     list_filter = ('current_level', 'placement_test_taken')
-    search_fields = ('user__username',)
\ No newline at end of file
+    search_fields = ('user__username',)
+    readonly_fields = ('terms_studied_count', 'rules_studied_count', 'problems_solved_count')
+    # Plain selects would load every user and every item into the form
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('terms_studied', 'rules_studied', 'problems_solved')
+    action_form = UserProgressActionForm
+    actions = ['set_level', 'reset_progress']
+    
+    @admin.action(description='Move selected learners to the chosen level')
+    def set_level(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        level = form.cleaned_data['level'] if form.is_valid() else None
+        if level is None:
+            self.message_user(request, "Choose a level first.", messages.WARNING)
+            return
+        updated = bulk.set_level(queryset, level)
+        self.message_user(request, f"Moved {updated} learner(s) to level {level.level}.")
+    
+    @admin.action(description='Reset progress of selected learners')
+    def reset_progress(self, request, queryset):
+        updated = bulk.reset_progress(queryset)
+        self.message_user(request, f"Reset progress of {updated} learner(s).")
+
+@admin.register(PlacementSubmission)
+class PlacementSubmissionAdmin(LargeTableAdmin):
+    list_display = ('user_progress', 'score', 'correct', 'total', 'created_at')
+    list_select_related = ('user_progress__user',)
+    raw_id_fields = ('user_progress',)
+    search_fields = ('user_progress__user__username',)
+    readonly_fields = ('answers', 'created_at')
+
+@admin.register(SiteCounter)
+class SiteCounterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value')
+    ordering = ('name',)
\ No newline at end of file
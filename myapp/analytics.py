@@ -0,0 +1,286 @@
+"""Learning analytics kept as daily rollups of an append-only event log.
+
+Every studied item, answered problem, placement result and level change is
+written to ProgressEvent, one insert in the transaction of the progress
+write it describes; nothing else happens on the request. roll_up(), run
+every few minutes by roll_up_analytics, folds the new events into two
+rollup tables: LearnerDay, one row per learner and day, and DailyRollup,
+one row per day, event kind, level and key for the whole site. Analytics
+pages read only the rollups, so they cost the same however many learners
+and items there are, and are as fresh as the last run. rebuild()
+recomputes both from the whole log.
+
+    kind        level              key
+    studied     level of the item  content type
+    answered    level of the item  "correct" or "wrong"
+    placement   level placed at    score rounded down to 10%
+    level       new level          old level
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .levels import get_level_by_id
+from .models import DailyRollup, LearnerDay, ProgressEvent, SiteCounter
+
+STUDIED = 'studied'
+ANSWERED = 'answered'
+PLACEMENT = 'placement'
+LEVEL = 'level'
+
+CORRECT = 'correct'
+WRONG = 'wrong'
+
+# content type -> LearnerDay column
+STUDIED_COLUMNS = {
+    'term': 'terms',
+    'rule': 'rules',
+    'problem': 'problems',
+}
+
+SITE_CACHE_KEY = 'analytics:site:{days}'
+# Site-wide numbers may lag this many seconds behind the rollups
+SITE_CACHE_SECONDS = 60
+
+# SiteCounter holding the id of the last event in the rollups
+ROLLED_UP_TO = 'analytics_rolled_up_to'
+# Events younger than this are left for the next roll_up(), so transactions
+# that took an id earlier but commit later are not skipped
+SETTLE_SECONDS = 60
+
+LEARNER_COLUMNS = list(STUDIED_COLUMNS.values()) + ['answered', 'correct']
+
+
+# Events are (kind, level number, key, count) tuples
+def studied(content_type, level_id, count=1):
+    return (STUDIED, get_level_by_id(level_id).level, content_type, count)
+
+
+def answered(level_id, is_correct):
+    return (ANSWERED, get_level_by_id(level_id).level, CORRECT if is_correct else WRONG, 1)
+
+
+def placed(level_num, score):
+    return (PLACEMENT, level_num, str(min(int(score) // 10 * 10, 100)), 1)
+
+
+def moved(old_level_num, new_level_num, count=1):
+    return (LEVEL, new_level_num, str(old_level_num), count)
+
+
+def record(user_progress_id, events):
+    """Log a learner's events, one insert.
+
+    Call it in the transaction that writes the progress the events describe,
+    so neither is kept without the other.
+    """
+    if not events:
+        return
+    now = timezone.now()
+    totals = defaultdict(int)
+    for kind, level, key, count in events:
+        totals[(kind, level, key)] += count
+    ProgressEvent.objects.bulk_create([
+        ProgressEvent(user_progress_id=user_progress_id, created_at=now, kind=kind, level=level, key=key, count=count)
+        for (kind, level, key), count in totals.items()
+    ])
+
+
+def learner_stats(user_progress):
+    """The numbers on the learner's analytics page, one query"""
+    totals = LearnerDay.objects.filter(user_progress_id=user_progress.pk).aggregate(
+        days=Count('id'),
+        terms=Sum('terms'),
+        rules=Sum('rules'),
+        problems=Sum('problems'),
+        answered=Sum('answered'),
+        correct=Sum('correct'),
+    )
+    days = totals['days']
+    studied_total = sum(totals[column] or 0 for column in STUDIED_COLUMNS.values())
+    answered_total = totals['answered'] or 0
+    counts = {
+        'Terms': user_progress.terms_studied_count,
+        'Rules': user_progress.rules_studied_count,
+        'Problems': user_progress.problems_solved_count,
+    }
+    return {
+        'total_items': sum(counts.values()),
+        'terms_count': counts['Terms'],
+        'rules_count': counts['Rules'],
+        'problems_count': counts['Problems'],
+        'success_rate': round(100 * (totals['correct'] or 0) / answered_total, 1) if answered_total else 0,
+        'learning_pace': round(studied_total / days, 1) if days else 0,
+        'content_preference': max(counts, key=counts.get) if any(counts.values()) else 'None yet',
+        'days_active': days,
+    }
+
+
+def site_stats(days=30):
+    """Site-wide rollups of the last `days` days, cached briefly"""
+    key = SITE_CACHE_KEY.format(days=days)
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    studied_per_level = defaultdict(lambda: {content_type: 0 for content_type in STUDIED_COLUMNS})
+    answers = defaultdict(lambda: {CORRECT: 0, WRONG: 0})
+    placements = defaultdict(int)
+    transitions = defaultdict(int)
+    rows = DailyRollup.objects.filter(day__gte=since).values('metric', 'level', 'key').annotate(value=Sum('value'))
+    for row in rows.order_by():
+        metric, level, key, value = row['metric'], row['level'], row['key'], row['value']
+        if metric == STUDIED:
+            studied_per_level[level][key] += value
+        elif metric == ANSWERED:
+            answers[level][key] += value
+        elif metric == PLACEMENT:
+            placements[int(key)] += value
+        elif metric == LEVEL:
+            transitions[(int(key), level)] += value
+
+    stats = {
+        'days': days,
+        'studied': [dict(level=level, **counts) for level, counts in sorted(studied_per_level.items())],
+        'accuracy': [
+            {
+                'level': level,
+                'answered': counts[CORRECT] + counts[WRONG],
+                'success_rate': round(100 * counts[CORRECT] / (counts[CORRECT] + counts[WRONG]), 1),
+            }
+            for level, counts in sorted(answers.items())
+        ],
+        'placements': [{'score': score, 'count': count} for score, count in sorted(placements.items())],
+        'transitions': [
+            {'from_level': old, 'to_level': new, 'count': count}
+            for (old, new), count in sorted(transitions.items())
+        ],
+    }
+    cache.set(key, stats, SITE_CACHE_SECONDS)
+    return stats
+
+
+def site_rows(events):
+    """DailyRollup values of a ProgressEvent queryset"""
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    return (
+        events.annotate(day=day).values('day', 'kind', 'level', 'key')
+        .annotate(value=Sum('count')).order_by()
+    )
+
+
+def learner_rows(events):
+    """LearnerDay values of a ProgressEvent queryset"""
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    return (
+        events.filter(user_progress__isnull=False, kind__in=[STUDIED, ANSWERED])
+        .annotate(day=day).values('user_progress_id', 'day')
+        .annotate(
+            **{
+                column: Sum('count', filter=Q(kind=STUDIED, key=content_type), default=0)
+                for content_type, column in STUDIED_COLUMNS.items()
+            },
+            answered=Sum('count', filter=Q(kind=ANSWERED), default=0),
+            correct=Sum('count', filter=Q(kind=ANSWERED, key=CORRECT), default=0),
+        ).order_by()
+    )
+
+
+def roll_up(batch_size=2000, settle_seconds=SETTLE_SECONDS):
+    """Add events logged since the last run to the rollups, returns how many.
+
+    An event whose transaction stays open longer than settle_seconds may be
+    missed; rebuild() puts that right.
+    """
+    with transaction.atomic():
+        # Locked, so two runs at once can't add the same events twice
+        state, _ = SiteCounter.objects.select_for_update().get_or_create(name=ROLLED_UP_TO)
+        new = ProgressEvent.objects.filter(id__gt=state.value)
+        settled = new.filter(created_at__lt=timezone.now() - timedelta(seconds=settle_seconds))
+        totals = settled.aggregate(last=Max('id'), count=Count('id'))
+        if totals['last'] is None:
+            return 0
+        events = new.filter(id__lte=totals['last'])
+
+        rows = list(site_rows(events))
+        existing = {
+            (obj.day, obj.metric, obj.level, obj.key): obj
+            for obj in DailyRollup.objects.filter(day__in={row['day'] for row in rows})
+        }
+        add_rows(DailyRollup, existing, (
+            ((row['day'], row['kind'], row['level'], row['key']),
+             DailyRollup(day=row['day'], metric=row['kind'], level=row['level'], key=row['key'], value=row['value']))
+            for row in rows
+        ), ['value'], batch_size)
+
+        rows = list(learner_rows(events))
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            existing = {
+                (obj.user_progress_id, obj.day): obj
+                for obj in LearnerDay.objects.filter(
+                    user_progress_id__in={row['user_progress_id'] for row in batch},
+                    day__in={row['day'] for row in batch},
+                )
+            }
+            add_rows(LearnerDay, existing, (
+                ((row['user_progress_id'], row['day']), LearnerDay(**row)) for row in batch
+            ), LEARNER_COLUMNS, batch_size)
+
+        state.value = totals['last']
+        state.save(update_fields=['value'])
+    return totals['count']
+
+
+def add_rows(model, existing, keyed_rows, fields, batch_size):
+    """Add each (key, new row) to the existing row of that key, or create it"""
+    changed = []
+    created = []
+    for key, row in keyed_rows:
+        obj = existing.get(key)
+        if obj is None:
+            created.append(row)
+            continue
+        for field in fields:
+            setattr(obj, field, getattr(obj, field) + getattr(row, field))
+        changed.append(obj)
+    model.objects.bulk_update(changed, fields, batch_size=batch_size)
+    model.objects.bulk_create(created, batch_size=batch_size)
+
+
+def rebuild(batch_size=2000):
+    """Recompute both rollup tables from the event log, returns their row counts"""
+    with transaction.atomic():
+        state, _ = SiteCounter.objects.select_for_update().get_or_create(name=ROLLED_UP_TO)
+        # Everything up to now; roll_up() carries on from here
+        last = ProgressEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        events = ProgressEvent.objects.filter(id__lte=last)
+        DailyRollup.objects.all().delete()
+        LearnerDay.objects.all().delete()
+        site_written = write_batches(DailyRollup, (
+            DailyRollup(day=row['day'], metric=row['kind'], level=row['level'], key=row['key'], value=row['value'])
+            for row in site_rows(events).iterator()
+        ), batch_size)
+        learner_written = write_batches(
+            LearnerDay, (LearnerDay(**row) for row in learner_rows(events).iterator()), batch_size
+        )
+        state.value = last
+        state.save(update_fields=['value'])
+    return site_written, learner_written
+
+
+def write_batches(model, objs, batch_size):
+    written = 0
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            written += len(model.objects.bulk_create(batch))
+            batch = []
+    return written + len(model.objects.bulk_create(batch))
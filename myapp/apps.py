@@ -5,4 +5,5 @@ class MyappConfig(AppConfig):
     name = 'myapp'
     
     def ready(self):
+        import myapp.checks
         import myapp.signals
\ No newline at end of file
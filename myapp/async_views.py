@@ -0,0 +1,79 @@
+"""Async versions of the endpoints learners hit on every click.
+
+Used instead of the sync views in myapp/views.py when the project runs
+under ASGI (see ASYNC_PROGRESS_ENDPOINTS in settings), so a worker can wait
+on the database for many learners at once.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+
+from .catalog import afind_item
+from .models import UserProgress
+from .recording import arecord, record_answer
+
+
+async def _get_progress(request):
+    user = await request.auser()
+    try:
+        return await UserProgress.objects.aget(user=user)
+    except UserProgress.DoesNotExist:
+        return None
+
+
+@login_required
+async def mark_term_studied(request, term_id):
+    user_progress = await _get_progress(request)
+    if user_progress is None:
+        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    
+    if request.method == 'POST':
+        term = await afind_item('term', term_id, user_progress.current_level_id)
+        if term is None:
+            raise Http404
+        await arecord(user_progress, 'term', term)
+        return JsonResponse({'status': 'success'})
+    return JsonResponse({'status': 'error'})
+
+
+@login_required
+async def mark_rule_studied(request, rule_id):
+    user_progress = await _get_progress(request)
+    if user_progress is None:
+        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    
+    if request.method == 'POST':
+        rule = await afind_item('rule', rule_id, user_progress.current_level_id)
+        if rule is None:
+            raise Http404
+        await arecord(user_progress, 'rule', rule)
+        return JsonResponse({'status': 'success'})
+    return JsonResponse({'status': 'error'})
+
+
+@login_required
+async def check_problem_answer(request, problem_id):
+    user_progress = await _get_progress(request)
+    if user_progress is None:
+        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    
+    if request.method == 'POST':
+        problem = await afind_item('problem', problem_id, user_progress.current_level_id)
+        if problem is None:
+            raise Http404
+        user_answer = request.POST.get('answer', '').upper()
+        
+        is_correct = user_answer == problem.correct_answer
+        
+        if is_correct:
+            await arecord(user_progress, 'problem', problem)
+        # Building the event may read the level registry, which is sync
+        await sync_to_async(record_answer)(user_progress, problem, is_correct)
+        
+        return JsonResponse({
+            'status': 'success',
+            'is_correct': is_correct,
+            'correct_answer': problem.correct_answer,
+            'explanation': problem.explanation
+        })
+    return JsonResponse({'status': 'error'})
@@ -0,0 +1,306 @@
+"""Drive every route in myapp/urls.py through the test client and time it.
+
+Each scenario builds one request; the runner sends it, timing the call and
+reading the query count the metrics middleware kept on the request. Meant
+to run against a throwaway SQLite database filled by generate_dataset,
+since several scenarios write (marking items studied, registering, taking
+the placement test).
+"""
+import json
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+
+from . import search_assets, urls
+from .catalog import get_catalog
+from .models import UserProgress
+from .placement import get_answer_key
+
+SCRATCH_USERNAME = 'benchmark-scratch'
+PASSWORD = 'benchmark'
+SEARCH_WORDS = ['supply', 'demand', 'price', 'elasticity', 'market', 'equlibrium', 'inflaton']
+
+# label -> function(bench) returning (client, method, path, data)
+SCENARIOS = {}
+
+
+def scenario(label):
+    def register(func):
+        SCENARIOS[label] = func
+        return func
+    return register
+
+
+class Bench:
+    """Clients and sample data shared by the scenarios of one run"""
+
+    def __init__(self, learners, seed, prefix='bench'):
+        self.rng = random.Random(seed)
+        self.anonymous = Client()
+        # Learners made by generate_dataset, not the ones registered by earlier runs
+        progresses = list(
+            UserProgress.objects.filter(user__username__regex=rf'^{re.escape(prefix)}[0-9]+$')
+            .select_related('user').order_by('id')[:learners]
+        )
+        if not progresses:
+            raise ValueError("No benchmark learners found, run generate_dataset first")
+        self.learners = []
+        for progress in progresses:
+            client = Client()
+            client.force_login(progress.user)
+            self.learners.append((client, progress))
+
+        # Placement and start-from-zero move learners around, keep them on one account
+        scratch, created = User.objects.get_or_create(username=SCRATCH_USERNAME)
+        if created:
+            scratch.set_password(PASSWORD)
+            scratch.save()
+        self.scratch = Client()
+        self.scratch.force_login(scratch)
+
+    def learner(self):
+        return self.rng.choice(self.learners)
+
+    def client_ip(self):
+        # Logins and sign-ups are throttled per address, spread them out
+        return f'10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(1, 255)}'
+
+    def item_id(self, progress, content_type):
+        ids = get_catalog(progress.current_level_id).ids[content_type]
+        return self.rng.choice(ids) if ids else 0
+
+
+@scenario('index')
+def index(bench):
+    return bench.anonymous, 'get', '/', None
+
+
+@scenario('register')
+def register_form(bench):
+    return bench.anonymous, 'get', '/register/', None
+
+
+@scenario('register:post')
+def register_post(bench):
+    # A new client each time, the previous one is logged in
+    client = Client(REMOTE_ADDR=bench.client_ip())
+    return client, 'post', '/register/', {'username': f'benchrun-{uuid.uuid4().hex[:12]}', 'password': PASSWORD}
+
+
+@scenario('login')
+def login_form(bench):
+    return bench.anonymous, 'get', '/login/', None
+
+
+@scenario('login:post')
+def login_post(bench):
+    # Rotating through the learners keeps each username under its limit too
+    client, progress = bench.learner()
+    data = {'username': progress.user.username, 'password': PASSWORD}
+    return Client(REMOTE_ADDR=bench.client_ip()), 'post', '/login/', data
+
+
+@scenario('logout')
+def logout(bench):
+    client = Client()
+    client.force_login(User.objects.get(username=SCRATCH_USERNAME))
+    return client, 'get', '/logout/', None
+
+
+@scenario('dashboard')
+def dashboard(bench):
+    client, progress = bench.learner()
+    return client, 'get', '/dashboard/', None
+
+
+@scenario('start_from_zero')
+def start_from_zero(bench):
+    return bench.scratch, 'get', '/start-from-zero/', None
+
+
+@scenario('placement_test')
+def placement_form(bench):
+    return bench.scratch, 'get', '/placement-test/', None
+
+
+@scenario('placement_test:post')
+def placement_post(bench):
+    answers = {f'question_{qid}': bench.rng.choice('ABCD') for qid in get_answer_key()}
+    return bench.scratch, 'post', '/placement-test/', answers
+
+
+@scenario('adaptive_placement_test')
+def adaptive_question(bench):
+    return bench.scratch, 'get', '/placement-test/adaptive/', None
+
+
+@scenario('adaptive_placement_test:post')
+def adaptive_answer(bench):
+    current = bench.scratch.session.get('adaptive_test', {}).get('current')
+    if current is None:
+        # The last answer finished the test, start the next one
+        bench.scratch.get('/placement-test/adaptive/')
+        current = bench.scratch.session['adaptive_test']['current']
+    return bench.scratch, 'post', '/placement-test/adaptive/', {f'question_{current}': bench.rng.choice('ABCD')}
+
+
+@scenario('learning_content')
+def learning_content(bench):
+    client, progress = bench.learner()
+    return client, 'get', '/learning-content/', None
+
+
+@scenario('mark_term_studied')
+def mark_term_studied(bench):
+    client, progress = bench.learner()
+    return client, 'post', f"/mark-term-studied/{bench.item_id(progress, 'term')}/", None
+
+
+@scenario('mark_rule_studied')
+def mark_rule_studied(bench):
+    client, progress = bench.learner()
+    return client, 'post', f"/mark-rule-studied/{bench.item_id(progress, 'rule')}/", None
+
+
+@scenario('check_problem_answer')
+def check_problem_answer(bench):
+    client, progress = bench.learner()
+    path = f"/check-problem-answer/{bench.item_id(progress, 'problem')}/"
+    return client, 'post', path, {'answer': bench.rng.choice('ABCD')}
+
+
+@scenario('progress_events')
+def progress_events(bench):
+    client, progress = bench.learner()
+    events = []
+    for content_type, event_type in (('term', 'term_studied'), ('rule', 'rule_studied')):
+        events += [{'type': event_type, 'id': bench.item_id(progress, content_type)} for _ in range(4)]
+    events += [
+        {'type': 'problem_answered', 'id': bench.item_id(progress, 'problem'), 'answer': bench.rng.choice('ABCD')}
+        for _ in range(2)
+    ]
+    return client, 'post', '/progress/events/', json.dumps({'events': events})
+
+
+@scenario('learning_analytics')
+def learning_analytics(bench):
+    client, progress = bench.learner()
+    return client, 'get', '/analytics/', None
+
+
+@scenario('search')
+def search_page(bench):
+    return bench.anonymous, 'get', '/search/', None
+
+
+@scenario('search_api')
+def search_api(bench):
+    return bench.anonymous, 'get', '/search/api/', {'q': bench.rng.choice(SEARCH_WORDS)}
+
+
+@scenario('search_api:fuzzy')
+def search_api_fuzzy(bench):
+    return bench.anonymous, 'get', '/search/api/', {'q': bench.rng.choice(SEARCH_WORDS), 'fuzzy': '1'}
+
+
+@scenario('search_item')
+def search_item(bench):
+    client, progress = bench.learner()
+    return bench.anonymous, 'get', f"/search/item/term/{bench.item_id(progress, 'term')}/", None
+
+
+@scenario('search_index_asset')
+def search_index_asset(bench):
+    # Served by WhiteNoise in production, this is the fallback for newer files
+    # Pages never build index files, so make sure there are some
+    urls = search_assets.asset_urls() or search_assets.build() and search_assets.asset_urls()
+    url = bench.rng.choice(list(urls.values()))
+    return bench.anonymous, 'get', url, None
+
+
+@scenario('site_stats')
+def site_stats(bench):
+    return bench.anonymous, 'get', '/stats/', None
+
+
+@scenario('metrics')
+def metrics(bench):
+    client = bench.anonymous
+    if settings.METRICS_TOKEN:
+        client = Client(headers={'Authorization': f'Bearer {settings.METRICS_TOKEN}'})
+    return client, 'get', '/metrics/', None
+
+
+def missing_scenarios():
+    """URL names in myapp/urls.py that no scenario drives"""
+    covered = {label.split(':')[0] for label in SCENARIOS}
+    return [pattern.name for pattern in urls.urlpatterns if pattern.name not in covered]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run(iterations=50, warmup=5, learners=20, seed=0, labels=None, prefix='bench'):
+    """Run every scenario, returns label -> summary dict"""
+    bench = Bench(learners, seed, prefix)
+    results = {}
+    for label, build in SCENARIOS.items():
+        if labels and label not in labels:
+            continue
+        timings = []
+        queries = []
+        statuses = set()
+        for i in range(warmup + iterations):
+            client, method, path, data = build(bench)
+            kwargs = {'content_type': 'application/json'} if isinstance(data, str) else {}
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, **kwargs)
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(response.wsgi_request.request_stats.queries)
+            statuses.add(response.status_code)
+        timings.sort()
+        results[label] = {
+            'requests': len(timings),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries_avg': round(sum(queries) / len(queries), 1),
+            'queries_max': max(queries),
+            'statuses': sorted(statuses),
+        }
+    return results
+
+
+def check_budget(results, budget):
+    """Lines describing every result over its budget, empty when all fit"""
+    failures = []
+    for label, result in sorted(results.items()):
+        limits = budget.get(label, {})
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_max'):
+            if key in limits and result[key] > limits[key]:
+                failures.append(f"{label}: {key} {result[key]} > budget {limits[key]}")
+        for status in result['statuses']:
+            if status >= 500:
+                failures.append(f"{label}: returned {status}")
+    return failures
+
+
+def budget_from(results, headroom=2.0):
+    """A budget that the given results fit, latency with headroom, queries exact"""
+    return {
+        label: {'p95_ms': round(result['p95_ms'] * headroom, 1), 'queries_max': result['queries_max']}
+        for label, result in sorted(results.items())
+    }
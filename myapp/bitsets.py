@@ -0,0 +1,221 @@
+"""Studied items kept as one bitset per learner, level and content type.
+
+Every term, rule and problem has a slot that is dense within its level,
+assigned when it is created or moved (see myapp/signals.py). A learner's
+StudiedBitset row for that level has bit `slot` set once they studied it,
+so membership, counts and "first unstudied" are bit operations on a row
+that stays a few hundred bytes however far they get.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Greatest
+
+from .models import StudiedBitset, UserProgress
+
+# content type -> UserProgress counter, kept here when bitsets are the only storage
+COUNTERS = {
+    'term': 'terms_studied_count',
+    'rule': 'rules_studied_count',
+    'problem': 'problems_solved_count',
+}
+
+
+class Bitset:
+    def __init__(self, data=b''):
+        self.value = int.from_bytes(bytes(data), 'little')
+
+    def __contains__(self, slot):
+        return slot is not None and (self.value >> slot) & 1 == 1
+
+    def __len__(self):
+        return self.value.bit_count()
+
+    def add(self, slot):
+        """Set one bit, returns False if it already was"""
+        if slot in self:
+            return False
+        self.value |= 1 << slot
+        return True
+
+    def discard(self, slot):
+        if slot not in self:
+            return False
+        self.value &= ~(1 << slot)
+        return True
+
+    def first_missing(self, slots):
+        """First of the given slots whose bit is not set, or None"""
+        return next((slot for slot in slots if slot not in self), None)
+
+    def to_bytes(self):
+        return self.value.to_bytes((self.value.bit_length() + 7) // 8, 'little')
+
+
+def next_slot(model, level_id):
+    top = model.objects.filter(difficulty_id=level_id).aggregate(top=Max('slot'))['top']
+    return 0 if top is None else top + 1
+
+
+# Tries before giving up when concurrent writers keep taking the same slots
+SLOT_RETRIES = 5
+
+
+def assign_slots(model, level_ids):
+    """Give items without a slot the next free ones of their level, in id order.
+
+    Items saved one by one at the same time may take those slots first; the
+    unique (difficulty, slot) pair makes that an IntegrityError, and the
+    level is tried again from the new Max(slot).
+    """
+    for level_id in level_ids:
+        for attempt in range(SLOT_RETRIES):
+            try:
+                with transaction.atomic():
+                    rows = list(model.objects.filter(difficulty_id=level_id, slot__isnull=True).order_by('id').only('id'))
+                    if not rows:
+                        break
+                    start = next_slot(model, level_id)
+                    for i, row in enumerate(rows):
+                        row.slot = start + i
+                    model.objects.bulk_update(rows, ['slot'])
+                break
+            except IntegrityError:
+                if attempt == SLOT_RETRIES - 1:
+                    raise
+
+
+def load(user_progress_id, level_id):
+    """Content type -> Bitset of one learner at one level, in a single query"""
+    rows = StudiedBitset.objects.filter(user_progress_id=user_progress_id, level_id=level_id)
+    bitsets = {content_type: Bitset() for content_type in COUNTERS}
+    for content_type, bits in rows.values_list('content_type', 'bits'):
+        bitsets[content_type] = Bitset(bits)
+    return bitsets
+
+
+def add(user_progress_id, content_type, level_id, slots, update_counter):
+    """Set the bits of the given slots, returns how many were new.
+
+    The row is locked while it is rewritten so concurrent requests from the
+    same learner can't lose each other's bits.
+    """
+    with transaction.atomic():
+        row, created = StudiedBitset.objects.select_for_update().get_or_create(
+            user_progress_id=user_progress_id, level_id=level_id, content_type=content_type
+        )
+        bits = Bitset(row.bits)
+        added = sum(1 for slot in slots if bits.add(slot))
+        if added:
+            row.bits = bits.to_bytes()
+            row.count = len(bits)
+            row.save(update_fields=['bits', 'count'])
+            if update_counter:
+                counter = COUNTERS[content_type]
+                UserProgress.objects.filter(pk=user_progress_id).update(**{counter: F(counter) + added})
+    return added
+
+
+def discard(user_progress_ids, content_type, slots_by_level=None):
+    """Clear bits of these learners, {level_id: [slots]} or all of the content type.
+
+    Used when items are taken off learners in dual mode; the counters are
+    left alone as they are recounted from the through tables.
+    """
+    rows = StudiedBitset.objects.filter(user_progress_id__in=user_progress_ids, content_type=content_type)
+    if slots_by_level is None:
+        rows.delete()
+        return
+    with transaction.atomic():
+        changed = []
+        for row in rows.select_for_update().filter(level_id__in=slots_by_level):
+            bits = Bitset(row.bits)
+            if sum(bits.discard(slot) for slot in slots_by_level[row.level_id]):
+                row.bits = bits.to_bytes()
+                row.count = len(bits)
+                changed.append(row)
+        StudiedBitset.objects.bulk_update(changed, ['bits', 'count'], batch_size=500)
+
+
+def _rows_with(content_type, level_id, slot):
+    rows = StudiedBitset.objects.select_for_update().filter(level_id=level_id, content_type=content_type)
+    for row in rows.iterator():
+        bits = Bitset(row.bits)
+        if bits.discard(slot):
+            row.bits = bits.to_bytes()
+            row.count = len(bits)
+            yield row
+
+
+def remove_slot(content_type, level_id, slot, update_counters):
+    """Clear one item's bit for every learner, e.g. when it is deleted.
+
+    Deletes are rare, so the level's rows are simply scanned.
+    """
+    with transaction.atomic():
+        changed = list(_rows_with(content_type, level_id, slot))
+        StudiedBitset.objects.bulk_update(changed, ['bits', 'count'], batch_size=500)
+        if update_counters and changed:
+            counter = COUNTERS[content_type]
+            UserProgress.objects.filter(pk__in=[row.user_progress_id for row in changed]).update(
+                **{counter: Greatest(F(counter) - 1, 0)}
+            )
+
+
+def move_slot(content_type, old_level_id, old_slot, new_level_id, new_slot):
+    """Carry an item's bit along when it moves to another level"""
+    with transaction.atomic():
+        changed = list(_rows_with(content_type, old_level_id, old_slot))
+        StudiedBitset.objects.bulk_update(changed, ['bits', 'count'], batch_size=500)
+        for row in changed:
+            # Counters stay as they are, the item is still studied
+            add(row.user_progress_id, content_type, new_level_id, [new_slot], update_counter=False)
+
+
+def build_rows(user_progress_id, studied):
+    """Unsaved StudiedBitset rows from {(content_type, level_id): [slots]}"""
+    rows = []
+    for (content_type, level_id), slots in studied.items():
+        bits = Bitset()
+        for slot in slots:
+            bits.add(slot)
+        rows.append(StudiedBitset(
+            user_progress_id=user_progress_id, level_id=level_id, content_type=content_type,
+            bits=bits.to_bytes(), count=len(bits),
+        ))
+    return rows
+
+
+def backfill(user_progress_ids):
+    """Rewrite the bitsets of these learners from the through tables, returns rows written.
+
+    Safe to run again: rows are upserted with whatever the through tables
+    hold, so it can be repeated until the switch to bitset storage.
+    """
+    # Writers in dual mode wait on these rows until the batch is done
+    list(StudiedBitset.objects.select_for_update().filter(user_progress_id__in=user_progress_ids).values_list('id'))
+    studied = {pk: {} for pk in user_progress_ids}
+    for content_type, field in (('term', 'terms_studied'), ('rule', 'rules_studied'), ('problem', 'problems_solved')):
+        through = UserProgress._meta.get_field(field).remote_field.through
+        item = UserProgress._meta.get_field(field).related_model._meta.model_name
+        rows = through.objects.filter(userprogress_id__in=user_progress_ids).values_list(
+            'userprogress_id', f'{item}__difficulty_id', f'{item}__slot'
+        )
+        for pk, level_id, slot in rows.iterator():
+            studied[pk].setdefault((content_type, level_id), []).append(slot)
+
+    rows = [row for pk, slots in studied.items() for row in build_rows(pk, slots)]
+    StudiedBitset.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['user_progress', 'level', 'content_type'],
+        update_fields=['bits', 'count'],
+    )
+    # Levels a learner no longer has anything at
+    stale = [
+        row_id for row_id, pk, content_type, level_id in StudiedBitset.objects.filter(
+            user_progress_id__in=user_progress_ids
+        ).values_list('id', 'user_progress_id', 'content_type', 'level_id')
+        if (content_type, level_id) not in studied[pk]
+    ]
+    StudiedBitset.objects.filter(id__in=stale).delete()
+    return len(rows)
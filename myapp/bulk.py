@@ -0,0 +1,67 @@
+"""Changes to many learners at once, used by the admin actions.
+
+Each runs a handful of set-based statements however many learners are
+selected, so the per-row signals in myapp/signals.py never fire. What they
+would have kept in step is updated here instead: the learners-per-level
+counters, the analytics log, studied bitsets and cursors, and the session
+snapshots.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from . import analytics, snapshots, stats
+from .levels import get_level, get_level_by_id
+from .models import ContentCursor, StudiedBitset, UserProgress
+from .recording import STUDIED_FIELDS
+
+
+def move_learners(queryset, level, **changes):
+    """Put the learners on a level in one UPDATE, with any other field changes.
+
+    Returns how many learners were updated. Call inside a transaction.
+    """
+    # Before the update, which may take rows out of a filtered queryset
+    per_level = dict(
+        queryset.exclude(current_level=level).order_by().values_list('current_level_id').annotate(n=Count('id'))
+    )
+    updated = UserProgress.objects.filter(pk__in=queryset.values('pk')).update(current_level=level, **changes)
+
+    for level_id, n in per_level.items():
+        stats.increment(stats.level_counter(get_level_by_id(level_id).level), -n)
+    if per_level:
+        stats.increment(stats.level_counter(level.level), sum(per_level.values()))
+    # Logged without a learner, as one event per old level
+    analytics.record(None, [
+        analytics.moved(get_level_by_id(level_id).level, level.level, n) for level_id, n in per_level.items()
+    ])
+    snapshots.invalidate_all()
+    return updated
+
+
+def set_level(queryset, level):
+    """Put the selected learners on a level, returns how many were selected"""
+    with transaction.atomic():
+        return move_learners(queryset, level)
+
+
+def reset_progress(queryset):
+    """Forget everything the selected learners studied and put them back on level 1.
+
+    Returns how many learners were reset.
+    """
+    with transaction.atomic():
+        ids = queryset.values('pk')
+        for field in STUDIED_FIELDS.values():
+            through = UserProgress._meta.get_field(field).remote_field.through
+            through.objects.filter(userprogress_id__in=ids).delete()
+        StudiedBitset.objects.filter(user_progress_id__in=ids).delete()
+        ContentCursor.objects.filter(user_progress_id__in=ids).delete()
+        return move_learners(
+            queryset,
+            get_level(1),
+            terms_studied_count=0,
+            rules_studied_count=0,
+            problems_solved_count=0,
+            placement_test_taken=False,
+            placement_test_score=0,
+        )
@@ -0,0 +1,99 @@
+import threading
+
+
+from .levels import get_level_by_id
+from .models import Problem, RuleTheory, Term
+from .routers import primary
+from .versions import aget_version, bump_version as versions_bump, get_version
+
+CATALOG_MODELS = {
+    'term': Term,
+    'rule': RuleTheory,
+    'problem': Problem,
+}
+
+VERSION_KEY = 'catalog:version:{level_id}'
+
+
+class LevelCatalog:
+    """Everything learners can be shown at one level, loaded in one go.
+
+    Items are unsaved-looking model instances so templates can use them
+    exactly like rows from the database. They are shared between requests,
+    so treat them as read-only.
+    """
+
+    def __init__(self, level, version):
+        self.level = level
+        self.version = version
+        self.items = {}
+        self.ids = {}
+        for content_type, model in CATALOG_MODELS.items():
+            with primary():
+                objects = list(model.objects.filter(difficulty=level).order_by('id'))
+            for obj in objects:
+                obj.difficulty = level
+            self.items[content_type] = {obj.id: obj for obj in objects}
+            self.ids[content_type] = [obj.id for obj in objects]
+        self.answer_key = {obj.id: obj.correct_answer for obj in self.items['problem'].values()}
+
+    def get(self, content_type, obj_id):
+        return self.items[content_type].get(obj_id)
+
+
+_catalogs = {}
+_lock = threading.Lock()
+
+
+def current_version(level_id):
+    return get_version(VERSION_KEY.format(level_id=level_id))
+
+
+def bump_version(level_id):
+    """Mark one level's catalog as stale in every worker sharing the cache"""
+    versions_bump(VERSION_KEY.format(level_id=level_id))
+
+
+def get_catalog(level_id):
+    """Catalog for a level, rebuilt only when its version has moved on"""
+    version = current_version(level_id)
+    catalog = _catalogs.get(level_id)
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        catalog = _catalogs.get(level_id)
+        if catalog is None or catalog.version != version:
+            level = get_level_by_id(level_id)
+            catalog = LevelCatalog(level, version)
+            _catalogs[level_id] = catalog
+    return catalog
+
+
+def find_item(content_type, obj_id, level_id=None):
+    """Look an item up in the catalog of the given level, then in the database.
+
+    Learners almost always act on items of their current level, so passing it
+    avoids the query. Returns None when the item does not exist.
+    """
+    if level_id is not None:
+        obj = get_catalog(level_id).get(content_type, obj_id)
+        if obj is not None:
+            return obj
+    return CATALOG_MODELS[content_type].objects.filter(pk=obj_id).first()
+
+
+async def afind_item(content_type, obj_id, level_id=None):
+    """Async find_item: uses a level's catalog only if this worker already has it.
+
+    Building a catalog is sync work, so a cold level falls back to a single
+    async query rather than blocking the event loop.
+    """
+    if level_id is not None:
+        catalog = _catalogs.get(level_id)
+        version = await aget_version(VERSION_KEY.format(level_id=level_id))
+        if catalog is not None and catalog.version == version:
+            obj = catalog.get(content_type, obj_id)
+            if obj is not None:
+                return obj
+    return await CATALOG_MODELS[content_type].objects.filter(pk=obj_id).afirst()
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+# Shared, but every version check would be a query or a file read
+SLOW_SHARED_CACHES = {
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Content versions and throttles need a fast cache all workers share"""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.WEB_CONCURRENCY > 1 and backend in PROCESS_LOCAL_CACHES | SLOW_SHARED_CACHES:
+        reason = 'private to each process' if backend in PROCESS_LOCAL_CACHES else 'not in memory'
+        return [Error(
+            f"{backend} is {reason}, but WEB_CONCURRENCY runs {settings.WEB_CONCURRENCY} workers.",
+            hint="Set CACHE_BACKEND (and CACHE_LOCATION) to redis or memcached, "
+                 "e.g. django.core.cache.backends.redis.RedisCache.",
+            id='myapp.E001',
+        )]
+    return []
+
+
+@register(Tags.security, deploy=True)
+def check_trusted_proxies(app_configs, **kwargs):
+    """Behind a proxy nobody told us about, all clients share one address"""
+    if not settings.TRUSTED_PROXIES:
+        return [Warning(
+            "TRUSTED_PROXIES is 0, so login and sign-up limits are kept per REMOTE_ADDR.",
+            hint="If the app runs behind a load balancer or proxy, set TRUSTED_PROXIES to the number of them.",
+            id='myapp.W001',
+        )]
+    return []
@@ -0,0 +1,138 @@
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+
+from . import bitsets, catalog, fuzzy, levels, placement, progression, recording, search, search_assets
+from .models import DifficultyLevel, Problem, RuleTheory, Term, TestQuestion
+
+# type used in files -> (model, columns besides external_id and level)
+CONTENT_TYPES = {
+    'term': (Term, ['title', 'explanation']),
+    'rule': (RuleTheory, ['title', 'explanation']),
+    'problem': (Problem, ['question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer', 'explanation']),
+    'test_question': (TestQuestion, ['question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer', 'explanation']),
+}
+
+
+def columns(content_type):
+    return ['type', 'external_id', 'level'] + CONTENT_TYPES[content_type][1]
+
+
+def read_rows(f, fmt, content_type=None):
+    """Yield row dicts from an open JSONL or CSV file, one at a time"""
+    if fmt == 'csv':
+        for row in csv.DictReader(f):
+            row.setdefault('type', content_type)
+            if not row['type']:
+                row['type'] = content_type
+            yield row
+    else:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                row.setdefault('type', content_type)
+                yield row
+
+
+def row_errors(content_type, row):
+    """What the model's fields reject in a row, as "field: message" strings.
+
+    Checked field by field, without queries, so a bad row is reported with
+    its line number before it can fail the bulk insert of its whole batch.
+    """
+    model, fields = CONTENT_TYPES[content_type]
+    obj = model(external_id=str(row['external_id']), **{field: row.get(field) or '' for field in fields})
+    try:
+        obj.clean_fields(exclude=['difficulty', 'slot'])
+    except ValidationError as e:
+        return [f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()]
+    return []
+
+
+def upsert(content_type, rows):
+    """Insert or update one batch keyed on external_id, returns rows written"""
+    model, fields = CONTENT_TYPES[content_type]
+    # Keys are strings in the database, JSONL may hold numbers
+    for row in rows:
+        row['external_id'] = str(row['external_id'])
+    # A row may appear twice in a batch, the last one wins
+    rows = {row['external_id']: row for row in rows}.values()
+    # Levels come from the registry, so the batch costs no lookups
+    objects = [
+        model(
+            external_id=row['external_id'],
+            difficulty=levels.get_level(int(row['level'])),
+            **{field: row.get(field) or '' for field in fields},
+        )
+        for row in rows
+    ]
+    slotted = content_type in progression.CONTENT_TYPES
+    # Items moving to another level may land behind learners' cursors
+    old_levels = {}
+    old_slots = {}
+    existing = model.objects.filter(external_id__in=[obj.external_id for obj in objects])
+    for row in existing.values('external_id', 'difficulty_id', *(['slot'] if slotted else [])):
+        old_levels[row['external_id']] = row['difficulty_id']
+        old_slots[row['external_id']] = row.get('slot')
+    if slotted:
+        # Items keep their bit unless they change level, see myapp/bitsets.py
+        for obj in objects:
+            if old_levels.get(obj.external_id) == obj.difficulty_id:
+                obj.slot = old_slots[obj.external_id]
+
+    model.objects.bulk_create(
+        objects,
+        update_conflicts=True,
+        unique_fields=['external_id'],
+        update_fields=fields + ['difficulty', 'updated_at'] + (['slot'] if slotted else []),
+    )
+
+    if slotted:
+        bitsets.assign_slots(model, {obj.difficulty_id for obj in objects})
+        moved = [
+            obj for obj in objects
+            if obj.external_id in old_levels and old_levels[obj.external_id] != obj.difficulty_id
+        ]
+        if moved:
+            current = {
+                external_id: (obj_id, slot)
+                for external_id, obj_id, slot in model.objects.filter(
+                    external_id__in=[obj.external_id for obj in moved]
+                ).values_list('external_id', 'id', 'slot')
+            }
+            for obj in moved:
+                obj.id, obj.slot = current[obj.external_id]
+                progression.rewind_cursors(content_type, obj)
+                if recording.writes_bitsets():
+                    bitsets.move_slot(
+                        content_type, old_levels[obj.external_id], old_slots[obj.external_id],
+                        obj.difficulty_id, obj.slot,
+                    )
+    return len(objects)
+
+
+def iter_rows(content_type, chunk_size=2000):
+    """Stream every row of one content type as dicts ready to be written"""
+    model, fields = CONTENT_TYPES[content_type]
+    queryset = model.objects.order_by('id').values_list('external_id', 'difficulty__level', *fields)
+    for values in queryset.iterator(chunk_size=chunk_size):
+        external_id, level, *rest = values
+        row = {'type': content_type, 'external_id': external_id, 'level': level}
+        row.update(zip(fields, rest))
+        yield row
+
+
+def content_imported(content_types):
+    """Bulk writes send no signals, so refresh what the receivers would have"""
+    DifficultyLevel.refresh_totals()
+    levels.invalidate()
+    for level in levels.all_levels():
+        catalog.bump_version(level.id)
+    if content_types & {'term', 'rule'}:
+        search.index.invalidate()
+        fuzzy.matcher.invalidate()
+        search_assets.build()
+    if 'test_question' in content_types:
+        placement.invalidate_answer_key()
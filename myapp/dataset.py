@@ -0,0 +1,228 @@
+"""Synthetic content and learners for benchmarks, see generate_dataset.
+
+Everything is derived from a seed, so the same arguments always give the
+same dataset. Content goes through content_io.upsert with bench-* external
+ids and learners are skipped when their username exists, so running it
+again tops the dataset up instead of duplicating it.
+"""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import bitsets, levels, recording, stats
+from .content_io import content_imported, upsert
+from .models import ContentCursor, StudiedBitset, UserProgress
+from .placement import LEVEL_BANDS
+from .progression import CONTENT_TYPES, MAX_LEVEL
+
+# How a level's items are split between terms, rules and problems
+ITEM_SHARES = {'term': 0.7, 'rule': 0.15, 'problem': 0.15}
+TEST_QUESTIONS_PER_LEVEL = 5
+
+# Share of learners at each level, most never get far
+LEVEL_WEIGHTS = [40, 25, 15, 12, 8]
+# Share of learners who registered but never studied anything
+NOT_STARTED_SHARE = 0.2
+# Share of learners above level 1 who got there through the placement test
+PLACED_SHARE = 0.3
+
+WORDS = (
+    'supply demand price elasticity market equilibrium cost revenue profit '
+    'margin inflation interest capital labour rent tax subsidy tariff trade '
+    'budget surplus deficit growth output income utility scarcity'
+).split()
+
+
+def items_per_type(items):
+    return {content_type: max(int(items * share), 1) for content_type, share in ITEM_SHARES.items()}
+
+
+def content_rows(content_type, level_num, count, rng):
+    for i in range(count):
+        external_id = f'bench-{content_type}-{level_num}-{i}'
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+        if content_type in ('term', 'rule'):
+            yield {
+                'external_id': external_id,
+                'level': level_num,
+                'title': f'{words.capitalize()} {level_num}.{i}',
+                'explanation': f'<p>{text}</p>',
+            }
+        else:
+            yield {
+                'external_id': external_id,
+                'level': level_num,
+                'question': f'What does {words} imply? ({level_num}.{i})',
+                'option_a': rng.choice(WORDS),
+                'option_b': rng.choice(WORDS),
+                'option_c': rng.choice(WORDS),
+                'option_d': rng.choice(WORDS),
+                'correct_answer': rng.choice('ABCD'),
+                'explanation': text,
+            }
+
+
+def generate_content(items, seed=0, batch_size=1000):
+    """Upsert `items` items per level plus a few test questions, returns rows written"""
+    rng = random.Random(seed)
+    counts = dict(items_per_type(items), test_question=TEST_QUESTIONS_PER_LEVEL)
+    written = 0
+    for level_num in range(1, MAX_LEVEL + 1):
+        for content_type, count in counts.items():
+            rows = list(content_rows(content_type, level_num, count, rng))
+            for start in range(0, len(rows), batch_size):
+                with transaction.atomic():
+                    written += upsert(content_type, rows[start:start + batch_size])
+    content_imported(set(counts))
+    return written
+
+
+def level_item_ids():
+    """level number -> content type -> ids in the order learners meet them"""
+    ids = {}
+    for level in levels.all_levels():
+        ids[level.level] = {
+            content_type: list(model.objects.filter(difficulty=level).order_by('id').values_list('id', flat=True))
+            for content_type, (model, field, position_field) in CONTENT_TYPES.items()
+        }
+    return ids
+
+
+def item_places():
+    """content type -> id -> (level id, slot)"""
+    return {
+        content_type: {
+            obj_id: (level_id, slot)
+            for obj_id, level_id, slot in model.objects.values_list('id', 'difficulty_id', 'slot')
+        }
+        for content_type, (model, field, position_field) in CONTENT_TYPES.items()
+    }
+
+
+def placement_score(level_num, rng):
+    minimum = next(minimum for minimum, band_level in LEVEL_BANDS if band_level == level_num)
+    return float(rng.randint(minimum, min(minimum + 19, 100)))
+
+
+def learner_profile(rng):
+    """(level number, placement score or None, share of the current level already studied)"""
+    if rng.random() < NOT_STARTED_SHARE:
+        return 1, None, 0.0
+    level_num = rng.choices(range(1, MAX_LEVEL + 1), weights=LEVEL_WEIGHTS)[0]
+    score = None
+    if level_num > 1 and rng.random() < PLACED_SHARE:
+        score = placement_score(level_num, rng)
+    return level_num, score, rng.betavariate(2, 3)
+
+
+def generate_users(count, password='benchmark', seed=0, prefix='bench', batch_size=500):
+    """Create `count` learners with progress spread over the levels, returns how many were new"""
+    rng = random.Random(seed)
+    # Hashing once keeps generation fast, every learner shares the password
+    password_hash = make_password(password)
+    level_objects = {level.level: level for level in levels.all_levels()}
+    item_ids = level_item_ids()
+    places = item_places() if recording.writes_bitsets() else None
+    created = 0
+
+    for start in range(0, count, batch_size):
+        usernames = [f'{prefix}{i}' for i in range(start, min(start + batch_size, count))]
+        # Draw every profile so the dataset does not depend on what already exists
+        profiles = {username: learner_profile(rng) for username in usernames}
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        new = [username for username in usernames if username not in existing]
+        if new:
+            with transaction.atomic():
+                created_level_counts = create_learners(new, profiles, password_hash, level_objects, item_ids, places)
+            for level_num, n in created_level_counts.items():
+                stats.increment(stats.level_counter(level_num), n)
+            stats.increment(stats.LEARNERS, len(new))
+            created += len(new)
+    return created
+
+
+def create_learners(usernames, profiles, password_hash, level_objects, item_ids, places=None):
+    users = User.objects.bulk_create([
+        User(username=username, password=password_hash) for username in usernames
+    ])
+    if any(user.pk is None for user in users):
+        # Backends that can't return ids from bulk inserts
+        ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        for user in users:
+            user.pk = ids[user.username]
+
+    progresses = []
+    studied = []
+    for user in users:
+        level_num, score, share = profiles[user.username]
+        placed = score is not None
+        # Placed learners skipped the levels below, the others finished them
+        done = {content_type: [] for content_type in CONTENT_TYPES}
+        for lower in range(level_num if placed else 1, level_num):
+            for content_type, ids in item_ids[lower].items():
+                done[content_type].extend(ids)
+        current = {}
+        for content_type, ids in item_ids[level_num].items():
+            current[content_type] = ids[:int(len(ids) * share)]
+            done[content_type].extend(current[content_type])
+
+        progresses.append(UserProgress(
+            user=user,
+            current_level=level_objects[level_num],
+            placement_test_taken=placed,
+            placement_test_score=score or 0,
+            **{
+                UserProgress.COUNTER_FIELDS[field]: len(done[content_type])
+                for content_type, (model, field, position_field) in CONTENT_TYPES.items()
+            },
+        ))
+        studied.append((done, current))
+
+    progresses = UserProgress.objects.bulk_create(progresses)
+    if any(progress.pk is None for progress in progresses):
+        ids = dict(UserProgress.objects.filter(user__in=users).values_list('user_id', 'id'))
+        for progress in progresses:
+            progress.pk = ids[progress.user_id]
+
+    for content_type, (model, field, position_field) in CONTENT_TYPES.items():
+        if not recording.writes_through():
+            break
+        through = UserProgress._meta.get_field(field).remote_field.through
+        fk = f'{model._meta.model_name}_id'
+        through.objects.bulk_create([
+            through(userprogress_id=progress.pk, **{fk: obj_id})
+            for progress, (done, current) in zip(progresses, studied)
+            for obj_id in done[content_type]
+        ], batch_size=2000)
+
+    if places is not None:
+        rows = []
+        for progress, (done, current) in zip(progresses, studied):
+            slots = {}
+            for content_type, ids in done.items():
+                for obj_id in ids:
+                    level_id, slot = places[content_type][obj_id]
+                    slots.setdefault((content_type, level_id), []).append(slot)
+            rows += bitsets.build_rows(progress.pk, slots)
+        StudiedBitset.objects.bulk_create(rows, batch_size=2000)
+
+    cursors = []
+    for progress, (done, current) in zip(progresses, studied):
+        # Learners study in id order, so the cursor sits on the last item done
+        cursors.append(ContentCursor(
+            user_progress=progress,
+            level=progress.current_level,
+            **{
+                position_field: current[content_type][-1] if current[content_type] else 0
+                for content_type, (model, field, position_field) in CONTENT_TYPES.items()
+            },
+        ))
+    ContentCursor.objects.bulk_create(cursors)
+
+    level_counts = {}
+    for progress in progresses:
+        level_counts[progress.current_level.level] = level_counts.get(progress.current_level.level, 0) + 1
+    return level_counts
@@ -0,0 +1,220 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .routers import primary
+from .versions import bump_version, get_version
+
+VERSION_KEY = 'fuzzy:version'
+# The title change that moved the version to this number
+CHANGE_KEY = 'fuzzy:change:{version}'
+CHANGE_SECONDS = 60 * 60
+# A worker further behind than this rebuilds instead of replaying
+MAX_REPLAY = 200
+
+WORD_RE = re.compile(r'\w+')
+
+# Minimum share of the query's trigrams that must appear in a title
+MIN_SCORE = 0.4
+
+
+def words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def trigrams(text):
+    """Trigrams of every word, padded the same way pg_trgm does"""
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """Maps trigrams to the keys of the strings containing them"""
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.grams = {}
+        self.values = {}
+
+    def add(self, key, text):
+        self.remove(key)
+        grams = trigrams(text)
+        self.grams[key] = grams
+        self.values[key] = text
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        for gram in self.grams.pop(key, ()):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+        self.values.pop(key, None)
+
+    def search(self, text, limit=10, min_score=MIN_SCORE):
+        """Keys ranked by how many of the query's trigrams they share.
+
+        Only the posting lists of the query's own trigrams are touched, so
+        the cost depends on the query and not on the size of the index.
+        """
+        query_grams = trigrams(text)
+        if not query_grams:
+            return []
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        matches = []
+        for key, count in shared.items():
+            # Share of the query found in the value, then overall similarity
+            score = count / len(query_grams)
+            if score < min_score:
+                continue
+            similarity = count / (len(query_grams) + len(self.grams[key]) - count)
+            matches.append((score, similarity, key))
+        matches.sort(key=lambda m: (-m[0], -m[1], self.values[m[2]].lower()))
+        return [(key, round(score, 4)) for score, similarity, key in matches[:limit]]
+
+
+class FuzzyMatcher:
+    """Typo-tolerant title lookup for terms and rules.
+
+    Each worker keeps its own copy in memory, built on first use. Once a
+    title save or delete commits, the receivers in myapp/signals.py store
+    the changed row in the cache under the next version number. Every worker,
+    the saving one included, replays the changes it missed on its next
+    lookup, and only rebuilds when one is gone from the cache, it is too far
+    behind, or the version moved for another reason (e.g. a level change).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.titles = TrigramIndex()
+        self.levels = {}
+        # Vocabulary of title words with reference counts, for "did you mean"
+        self.vocabulary = TrigramIndex()
+        self.word_counts = Counter()
+
+    def build(self, version):
+        from .search import SEARCH_MODELS
+
+        self.titles = TrigramIndex()
+        self.levels = {}
+        self.vocabulary = TrigramIndex()
+        self.word_counts = Counter()
+        with primary():
+            for kind, model in SEARCH_MODELS.items():
+                rows = model.objects.values_list('id', 'title', 'difficulty__level')
+                for obj_id, title, level in rows.iterator():
+                    self._add((kind, obj_id), title, level)
+        self.version = version
+
+    def ensure_built(self):
+        version = get_version(VERSION_KEY)
+        if self.version != version:
+            with self.lock:
+                if self.version != version and not self.catch_up(version):
+                    self.build(version)
+
+    def catch_up(self, version):
+        """Replay the changes since our version, False if they are not all there"""
+        if self.version is None or not 0 < version - self.version <= MAX_REPLAY:
+            return False
+        keys = [CHANGE_KEY.format(version=v) for v in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            kind, obj_id, title, level = changes[key]
+            if title is None:
+                self._remove((kind, obj_id))
+            else:
+                self._add((kind, obj_id), title, level)
+        self.version = version
+        return True
+
+    def _add(self, key, title, level):
+        self._remove(key)
+        self.titles.add(key, title)
+        self.levels[key] = level
+        for word in set(words(title)):
+            if self.word_counts[word] == 0:
+                self.vocabulary.add(word, word)
+            self.word_counts[word] += 1
+
+    def _remove(self, key):
+        title = self.titles.values.get(key)
+        if title is None:
+            return
+        for word in set(words(title)):
+            self.word_counts[word] -= 1
+            if self.word_counts[word] <= 0:
+                del self.word_counts[word]
+                self.vocabulary.remove(word)
+        self.titles.remove(key)
+        self.levels.pop(key, None)
+
+    def publish(self, change):
+        # After commit, so a rolled back save never reaches any copy
+        def run():
+            version = bump_version(VERSION_KEY)
+            cache.set(CHANGE_KEY.format(version=version), change, CHANGE_SECONDS)
+        transaction.on_commit(run)
+
+    def update(self, kind, obj_id, title, level):
+        self.publish((kind, obj_id, title, level))
+
+    def remove(self, kind, obj_id):
+        self.publish((kind, obj_id, None, None))
+
+    def invalidate(self):
+        bump_version(VERSION_KEY)
+
+    def search(self, query, kinds, limit=10):
+        self.ensure_built()
+        results = []
+        # Over-fetch a little so filtering by type still fills the page
+        for (kind, obj_id), score in self.titles.search(query, limit=limit * 3):
+            if kind not in kinds:
+                continue
+            results.append({
+                'type': kind,
+                'id': obj_id,
+                'title': self.titles.values[(kind, obj_id)],
+                'level': self.levels[(kind, obj_id)],
+                'score': score,
+            })
+            if len(results) == limit:
+                break
+        return results
+
+    def did_you_mean(self, query):
+        """Query with every unknown word replaced by its closest title word.
+
+        Returns None when every word is already known or nothing is close.
+        """
+        self.ensure_built()
+        corrected = []
+        changed = False
+        for word in words(query):
+            if word in self.word_counts:
+                corrected.append(word)
+                continue
+            matches = self.vocabulary.search(word, limit=1)
+            if not matches:
+                corrected.append(word)
+                continue
+            corrected.append(matches[0][0])
+            changed = True
+        return ' '.join(corrected) if changed else None
+
+
+matcher = FuzzyMatcher()
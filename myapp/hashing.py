@@ -0,0 +1,72 @@
+"""Password hashing on a small shared thread pool.
+
+PBKDF2 runs in C and releases the GIL, so a few threads hash in parallel
+while the number of hashes running at once, and the CPU they take, stays
+bounded however many requests arrive. When the pool and its queue are full
+new work is refused straight away with Busy, so a burst of sign-ups or
+credential stuffing fails fast instead of piling up request workers behind
+it. Only the hashing itself runs on the pool; database work stays on the
+request's thread and connection.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.contrib.auth.models import User
+
+# What login() records for users checked by check_credentials
+BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class Busy(Exception):
+    pass
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_THREADS, thread_name_prefix='hashing')
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_THREADS + settings.PASSWORD_HASHING_QUEUE)
+
+
+def run(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise Busy
+    try:
+        future = _executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda f: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    return run(make_password, password)
+
+
+def verify(password, encoded):
+    """Whether the password matches, with no rehashing (see needs_rehash)"""
+    return run(check_password, password, encoded)
+
+
+def needs_rehash(encoded):
+    try:
+        return identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        return False
+
+
+def check_credentials(username, password):
+    """The active user with these credentials or None, like ModelBackend.authenticate"""
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        # Hash anyway so unknown usernames take as long as wrong passwords
+        hash_password(password)
+        return None
+    if not verify(password, user.password) or not user.is_active:
+        return None
+    if needs_rehash(user.password):
+        # Hasher settings changed since the password was set
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return user
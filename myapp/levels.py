@@ -0,0 +1,84 @@
+import threading
+
+from .models import DifficultyLevel
+from .routers import primary
+from .versions import bump_version, get_version
+
+VERSION_KEY = 'levels:version'
+
+
+class LevelRegistry:
+    """The handful of DifficultyLevel rows, loaded once per worker.
+
+    Levels are seeded by migration 0007 and almost never change, so code
+    should look them up here instead of calling get_or_create. Saving or
+    deleting a level bumps a version in the cache and every worker reloads
+    on its next lookup. The returned instances are shared, don't modify them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.by_number = {}
+        self.by_id = {}
+
+    def load(self, version):
+        with primary():
+            levels = list(DifficultyLevel.objects.order_by('level'))
+        self.by_number = {level.level: level for level in levels}
+        self.by_id = {level.id: level for level in levels}
+        self.version = version
+
+    def ensure_loaded(self):
+        version = get_version(VERSION_KEY)
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.load(version)
+
+    def get(self, level_num):
+        self.ensure_loaded()
+        level = self.by_number.get(level_num)
+        if level is None:
+            # Not seeded yet (e.g. a fresh test database), create it once
+            level, created = DifficultyLevel.objects.get_or_create(level=level_num)
+            invalidate()
+            self.ensure_loaded()
+        return level
+
+    def get_by_id(self, level_id):
+        self.ensure_loaded()
+        level = self.by_id.get(level_id)
+        if level is None:
+            level = DifficultyLevel.objects.get(pk=level_id)
+            invalidate()
+        return level
+
+    def all(self):
+        self.ensure_loaded()
+        return list(self.by_number.values())
+
+
+registry = LevelRegistry()
+
+
+def invalidate():
+    bump_version(VERSION_KEY)
+
+
+def get_level(level_num):
+    return registry.get(level_num)
+
+
+def get_level_by_id(level_id):
+    return registry.get_by_id(level_id)
+
+
+def all_levels():
+    return registry.all()
+
+
+def attach_level(user_progress):
+    """Fill user_progress.current_level from the registry instead of a query"""
+    user_progress.current_level = get_level_by_id(user_progress.current_level_id)
+    return user_progress
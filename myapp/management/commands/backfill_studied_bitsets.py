@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp import bitsets
+from myapp.models import UserProgress
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the StudiedBitset rows from the through tables. Run with STUDIED_STORAGE=dual, "
+        "then switch to bitset; running it again is safe"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Learners rewritten per transaction (default 500)")
+
+    def handle(self, *args, **options):
+        ids = list(UserProgress.objects.order_by('id').values_list('id', flat=True))
+        written = 0
+        for start in range(0, len(ids), options['batch_size']):
+            with transaction.atomic():
+                written += bitsets.backfill(ids[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bitset rows for {len(ids)} learners"))
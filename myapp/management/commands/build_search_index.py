@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from myapp import search_assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the per-level search index files (titles and snippets as hashed, "
+        "precompressed JSON) into STATIC_ROOT. Run it after collectstatic."
+    )
+
+    def handle(self, *args, **options):
+        for level_num, name in sorted(search_assets.build().items()):
+            self.stdout.write(f"Level {level_num}: {name}")
+        self.stdout.write(self.style.SUCCESS("Search index files are up to date"))
@@ -0,0 +1,47 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.content_io import CONTENT_TYPES, columns, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream terms, rules, problems and test questions to JSONL or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', action='append', dest='types', choices=list(CONTENT_TYPES),
+                            help="Content type to export (can be repeated, default all)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+        parser.add_argument('-o', '--output', help="File to write, default stdout")
+
+    def handle(self, *args, **options):
+        types = options['types'] or list(CONTENT_TYPES)
+        if options['format'] == 'csv' and len(types) != 1:
+            raise CommandError("CSV export needs exactly one --type")
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        written = 0
+        started = time.monotonic()
+        try:
+            if options['format'] == 'csv':
+                writer = csv.DictWriter(out, fieldnames=columns(types[0]))
+                writer.writeheader()
+                for row in iter_rows(types[0]):
+                    writer.writerow(row)
+                    written += 1
+            else:
+                for content_type in types:
+                    for row in iter_rows(content_type):
+                        out.write(json.dumps(row, ensure_ascii=False) + '\n')
+                        written += 1
+        finally:
+            if options['output']:
+                out.close()
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {written} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} rows/sec)"
+        ))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.dataset import generate_content, generate_users, items_per_type
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic content and learners for benchmarks. "
+        "The same seed always gives the same data; running again tops it up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--items', type=int, default=200,
+                            help="Terms, rules and problems per difficulty level")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='benchmark',
+                            help="Password shared by every generated learner")
+        parser.add_argument('--prefix', default='bench', help="Usernames are <prefix><n>")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = generate_content(options['items'], seed=options['seed'])
+        split = ', '.join(f"{count} {content_type}s" for content_type, count in items_per_type(options['items']).items())
+        self.stdout.write(f"Wrote {written} content rows ({split} per level)")
+
+        created = generate_users(
+            options['users'], password=options['password'], seed=options['seed'], prefix=options['prefix']
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} learners, {options['users'] - created} already existed ({elapsed:.1f}s)"
+        ))
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.content_io import CONTENT_TYPES, content_imported, read_rows, row_errors, upsert
+from myapp.progression import MAX_LEVEL
+
+LEVELS = {str(level) for level in range(1, MAX_LEVEL + 1)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert terms, rules, problems and test questions from a JSONL or CSV file, "
+        "keyed on external_id. Rows need type (or --type), external_id, level and the "
+        "content columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=list(CONTENT_TYPES),
+                            help="Content type for files without a type column")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+
+        written = 0
+        seen_types = set()
+        started = time.monotonic()
+        # One pending batch per content type, flushed when full
+        pending = {content_type: [] for content_type in CONTENT_TYPES}
+
+        def flush(content_type):
+            nonlocal written
+            rows = pending[content_type]
+            if not rows:
+                return
+            with transaction.atomic():
+                written += upsert(content_type, rows)
+            pending[content_type] = []
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{written} rows ({written / elapsed:.0f} rows/sec)")
+
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                for line_no, row in enumerate(read_rows(f, fmt, options['type']), start=1):
+                    content_type = row.get('type')
+                    if content_type not in CONTENT_TYPES:
+                        raise CommandError(f"Row {line_no}: unknown type {content_type!r}")
+                    if not row.get('external_id') or not row.get('level'):
+                        raise CommandError(f"Row {line_no}: external_id and level are required")
+                    if str(row['level']) not in LEVELS:
+                        raise CommandError(f"Row {line_no}: level must be 1-{MAX_LEVEL}")
+                    errors = row_errors(content_type, row)
+                    if errors:
+                        raise CommandError(f"Row {line_no}: {'; '.join(errors)}")
+                    seen_types.add(content_type)
+                    pending[content_type].append(row)
+                    if len(pending[content_type]) >= batch_size:
+                        flush(content_type)
+            for content_type in CONTENT_TYPES:
+                flush(content_type)
+        finally:
+            if seen_types:
+                content_imported(seen_types)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {written} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} rows/sec)"
+        ))
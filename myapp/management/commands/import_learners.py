@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+import django
+from django.contrib.auth.forms import UsernameField
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp import stats
+from myapp.levels import get_level
+from myapp.models import UserProgress
+
+
+def _setup_worker():
+    # Spawned workers start without Django configured
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+    django.setup()
+
+
+def read_rows(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Create learners in bulk from a CSV or JSONL file with username, password "
+        "and optional email. Skips per-user signals; existing usernames are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Processes used to hash passwords")
+        parser.add_argument('--hashed', action='store_true',
+                            help="The password column already holds Django password hashes")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        level_1 = get_level(1)
+        created = skipped = 0
+        started = time.monotonic()
+
+        # Worker processes are only worth starting when there is hashing to do
+        if options['hashed']:
+            pool_context = nullcontext()
+        else:
+            pool_context = ProcessPoolExecutor(max_workers=options['workers'], initializer=_setup_worker)
+        with pool_context as pool:
+            for batch in batched(read_rows(path, fmt), options['batch_size']):
+                batch_created, batch_skipped = self.import_batch(batch, level_1, pool, options['hashed'])
+                created += batch_created
+                skipped += batch_skipped
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"{created} created, {skipped} skipped ({created / elapsed:.0f} users/sec)")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} learners in {elapsed:.1f}s, skipped {skipped}"
+        ))
+
+    def import_batch(self, rows, level_1, pool, hashed):
+        # Same clean-up as the sign-up form: stripped and NFKC-normalized,
+        # so "Alice " is not a second account next to "Alice"
+        read = len(rows)
+        for row in rows:
+            row['username'] = UsernameField().to_python(row.get('username'))
+        rows = [row for row in rows if row['username']]
+        usernames = [row['username'] for row in rows]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+        # Drop users that already exist and duplicates within the file
+        new_rows = {}
+        for row in rows:
+            if row['username'] not in existing:
+                new_rows.setdefault(row['username'], row)
+        new_rows = list(new_rows.values())
+        if not new_rows:
+            return 0, read
+
+        passwords = [row.get('password') or None for row in new_rows]
+        if hashed:
+            # No password means an unusable one, as make_password(None) gives
+            passwords = [password or make_password(None) for password in passwords]
+        else:
+            # PBKDF2 is the expensive part, spread it over all cores
+            passwords = list(pool.map(make_password, passwords, chunksize=max(len(passwords) // 32, 1)))
+
+        users = [
+            User(username=row['username'], email=row.get('email') or '', password=password)
+            for row, password in zip(new_rows, passwords)
+        ]
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backends that can't return ids from bulk inserts
+                ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+                for user in users:
+                    user.pk = ids[user.username]
+            UserProgress.objects.bulk_create([
+                UserProgress(user=user, current_level=level_1) for user in users
+            ])
+            # bulk_create sends no signals; counted with the batch so a later
+            # failing batch can't leave committed learners uncounted
+            stats.increment(stats.LEARNERS, len(users))
+            stats.increment(stats.level_counter(level_1.level), len(users))
+
+        # Rows without a username count as skipped too
+        return len(users), read - len(users)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily analytics rollups from the progress event log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        site_rows, learner_rows = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {site_rows} site rows and {learner_rows} learner rows"))
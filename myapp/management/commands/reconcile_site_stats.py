@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from myapp.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount site statistics from the user and progress tables (run periodically)"
+
+    def handle(self, *args, **options):
+        site_stats = reconcile()
+        levels = ', '.join(f"L{level}: {n}" for level, n in site_stats['levels'].items())
+        self.stdout.write(self.style.SUCCESS(f"{site_stats['learners']} learners ({levels})"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.placement import regrade_all
+
+
+class Command(BaseCommand):
+    help = "Re-score all stored placement test submissions against the current answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = regrade_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated {changed} submissions"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from myapp import levels, snapshots
+from myapp.models import DifficultyLevel, UserProgress
+
+
+class Command(BaseCommand):
+    help = "Recount stored progress counters and level totals from the studied items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', metavar='USERNAME',
+                            help="Only repair these users (can be repeated)")
+
+    def handle(self, *args, **options):
+        DifficultyLevel.refresh_totals()
+        # Workers keep the totals in their level registry
+        levels.invalidate()
+
+        queryset = UserProgress.objects.all()
+        if options['users']:
+            queryset = queryset.filter(user__username__in=options['users'])
+        updated = UserProgress.recount(queryset)
+        snapshots.invalidate_all()
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted progress for {updated} users"))
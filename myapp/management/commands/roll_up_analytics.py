@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myapp.analytics import SETTLE_SECONDS, roll_up
+
+
+class Command(BaseCommand):
+    help = "Add new progress events to the daily analytics rollups (run every few minutes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--settle-seconds', type=int, default=SETTLE_SECONDS,
+                            help="Leave events younger than this for the next run")
+
+    def handle(self, *args, **options):
+        events = roll_up(batch_size=options['batch_size'], settle_seconds=options['settle_seconds'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {events} events"))
@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from myapp import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every route through the test client and report p50/p95/p99 latency and "
+        "queries per request. Writes to the database, so run it on a throwaway SQLite "
+        "copy filled by generate_dataset. Fails when a result is over --budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--learners', type=int, default=20,
+                            help="Generated learners whose sessions are reused")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help="Username prefix used by generate_dataset")
+        parser.add_argument('--only', nargs='+', metavar='LABEL', help="Run only these scenarios")
+        parser.add_argument('--budget', help="JSON file of label -> {p50_ms, p95_ms, p99_ms, queries_max}")
+        parser.add_argument('--save-budget', metavar='PATH',
+                            help="Write a budget these results fit, for later runs to check against")
+        parser.add_argument('--headroom', type=float, default=2.0,
+                            help="Latency multiplier used by --save-budget")
+        parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON")
+
+    def handle(self, *args, **options):
+        missing = benchmark.missing_scenarios()
+        if missing:
+            raise CommandError(f"No benchmark scenario for: {', '.join(missing)}")
+        if options['only']:
+            unknown = set(options['only']) - set(benchmark.SCENARIOS)
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if connection.vendor != 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                f"Running against {connection.vendor}; numbers are only comparable between runs on the same setup"
+            ))
+
+        try:
+            results = benchmark.run(
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                learners=options['learners'],
+                seed=options['seed'],
+                labels=options['only'],
+                prefix=options['prefix'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'scenario':32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'max':>5}")
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:32} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+                f"{result['queries_avg']:8.1f} {result['queries_max']:5d}"
+            )
+
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['save_budget']:
+            with open(options['save_budget'], 'w') as f:
+                json.dump(benchmark.budget_from(results, options['headroom']), f, indent=2)
+            self.stdout.write(f"Saved budget to {options['save_budget']}")
+
+        if options['budget']:
+            with open(options['budget']) as f:
+                budget = json.load(f)
+        else:
+            budget = {}
+        failures = benchmark.check_budget(results, budget)
+        if failures:
+            raise CommandError("Over budget:\n" + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} scenarios within budget"))
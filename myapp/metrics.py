@@ -0,0 +1,305 @@
+"""In-process request metrics exposed in Prometheus text format.
+
+MetricsMiddleware times every request and, through an execute wrapper
+installed on each database connection, counts the queries it runs. The
+TimedDjangoTemplates backend adds template render time. Everything is
+aggregated per URL name in this process. With several gunicorn workers set
+METRICS_DIR: each worker then dumps its numbers there every few seconds and
+the /metrics/ endpoint merges all of them. Dumps that stop being refreshed
+belong to workers that exited or were recycled; they are left out and
+removed, so their pids can be reused without counters going backwards.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DUMP_INTERVAL = 5
+# Live workers refresh their dump every DUMP_INTERVAL, even when idle
+STALE_AFTER = 3 * DUMP_INTERVAL
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'template_time', 'aliases')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        # database alias -> [queries, seconds]
+        self.aliases = {}
+
+
+def empty_view_metrics():
+    return {
+        'requests': 0,
+        'latency_sum': 0.0,
+        'latency_buckets': [0] * len(LATENCY_BUCKETS),
+        'queries': 0,
+        'query_time': 0.0,
+        'template_time': 0.0,
+        'statuses': defaultdict(int),
+        'aliases': {},
+    }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(empty_view_metrics)
+        # Process the dump thread runs in, a forked worker starts its own
+        self.dumper_pid = None
+
+    def observe(self, view, status, latency, stats):
+        with self.lock:
+            m = self.views[view]
+            m['requests'] += 1
+            m['latency_sum'] += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    m['latency_buckets'][i] += 1
+            m['queries'] += stats.queries
+            m['query_time'] += stats.query_time
+            m['template_time'] += stats.template_time
+            m['statuses'][f'{status // 100}xx'] += 1
+            for alias, (queries, query_time) in stats.aliases.items():
+                totals = m['aliases'].setdefault(alias, [0, 0.0])
+                totals[0] += queries
+                totals[1] += query_time
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: dict(
+                    m, latency_buckets=list(m['latency_buckets']), statuses=dict(m['statuses']),
+                    aliases={alias: list(totals) for alias, totals in m['aliases'].items()},
+                )
+                for view, m in self.views.items()
+            }
+
+    def start_dumping(self):
+        """Dump to METRICS_DIR from a thread, so idle workers don't look dead"""
+        pid = os.getpid()
+        if not getattr(settings, 'METRICS_DIR', None) or self.dumper_pid == pid:
+            return
+        with self.lock:
+            if self.dumper_pid == pid:
+                return
+            self.dumper_pid = pid
+        threading.Thread(target=self.dump_forever, name='metrics-dump', daemon=True).start()
+
+    def dump_forever(self):
+        while True:
+            try:
+                self.dump(settings.METRICS_DIR)
+            except OSError:
+                pass
+            time.sleep(DUMP_INTERVAL)
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.query_time += elapsed
+        # Which database answered, the primary or one of the replicas
+        totals = stats.aliases.setdefault(context['connection'].alias, [0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # Every connection, in every thread, reports to the request that uses it
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+def install_query_wrappers():
+    # Connections opened before this module was imported never sent the signal
+    for connection in connections.all():
+        install_query_wrapper(None, connection)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that reports render time to the metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_wrappers()
+        stats = RequestStats()
+        # Also kept on the request so callers such as the benchmark can read it
+        request.request_stats = stats
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        request.request_stats = stats
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def finish(self, request, response, stats, latency):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        registry.observe(view, response.status_code, latency, stats)
+        registry.start_dumping()
+
+
+def merged_snapshot():
+    """This worker's live numbers plus the latest dumps of the other live workers"""
+    merged = defaultdict(empty_view_metrics)
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory and os.path.isdir(directory):
+        own = f'{os.getpid()}.json'
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == own:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_AFTER:
+                    # The worker is gone, drop its numbers before a new one gets the pid
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Half-written or removed while we were reading
+                continue
+
+    for snapshot in snapshots:
+        for view, m in snapshot.items():
+            total = merged[view]
+            for key in ('requests', 'latency_sum', 'queries', 'query_time', 'template_time'):
+                total[key] += m[key]
+            for i, count in enumerate(m['latency_buckets']):
+                total['latency_buckets'][i] += count
+            for status, count in m['statuses'].items():
+                total['statuses'][status] += count
+            # Dumps written before per-alias numbers existed have none
+            for alias, (queries, query_time) in m.get('aliases', {}).items():
+                totals = total['aliases'].setdefault(alias, [0, 0.0])
+                totals[0] += queries
+                totals[1] += query_time
+    return merged
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(snapshot):
+    lines = [
+        '# HELP clario_request_duration_seconds Request latency per view.',
+        '# TYPE clario_request_duration_seconds histogram',
+    ]
+    for view, m in sorted(snapshot.items()):
+        label = f'view="{escape_label(view)}"'
+        for bound, count in zip(LATENCY_BUCKETS, m['latency_buckets']):
+            lines.append(f'clario_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'clario_request_duration_seconds_bucket{{{label},le="+Inf"}} {m["requests"]}')
+        lines.append(f'clario_request_duration_seconds_sum{{{label}}} {m["latency_sum"]}')
+        lines.append(f'clario_request_duration_seconds_count{{{label}}} {m["requests"]}')
+
+    counters = [
+        ('clario_requests_total', 'Requests per view and status class.', None),
+        ('clario_db_queries_total', 'Database queries run per view.', 'queries'),
+        ('clario_db_query_duration_seconds_total', 'Time spent in database queries per view.', 'query_time'),
+        ('clario_template_render_seconds_total', 'Time spent rendering templates per view.', 'template_time'),
+    ]
+    for name, help_text, key in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, m in sorted(snapshot.items()):
+            label = f'view="{escape_label(view)}"'
+            if key is None:
+                for status, count in sorted(m['statuses'].items()):
+                    lines.append(f'{name}{{{label},status="{status}"}} {count}')
+            else:
+                lines.append(f'{name}{{{label}}} {m[key]}')
+
+    per_alias = [
+        ('clario_db_alias_queries_total', 'Database queries run per view and database alias.', 0),
+        ('clario_db_alias_query_duration_seconds_total', 'Time spent in queries per view and database alias.', 1),
+    ]
+    for name, help_text, index in per_alias:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for view, m in sorted(snapshot.items()):
+            label = f'view="{escape_label(view)}"'
+            for alias, totals in sorted(m['aliases'].items()):
+                lines.append(f'{name}{{{label},alias="{escape_label(alias)}"}} {totals[index]}')
+    return '\n'.join(lines) + '\n'
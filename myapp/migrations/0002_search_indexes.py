@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Must match TSVECTOR_SQL in myapp/search.py
+TSVECTOR_SQL = "to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(explanation, ''))"
+
+SEARCH_TABLES = ['myapp_term', 'myapp_ruletheory']
+
+
+def create_search_indexes(apps, schema_editor):
+    # Only Postgres has tsvector, other databases use the in-memory index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_gin ON {table} USING gin (({TSVECTOR_SQL}))"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(counts.annotate(c=Count('*')).values('c')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    DifficultyLevel = apps.get_model('myapp', 'DifficultyLevel')
+    UserProgress = apps.get_model('myapp', 'UserProgress')
+
+    DifficultyLevel.objects.update(
+        term_count=count_of(apps.get_model('myapp', 'Term').objects, 'difficulty'),
+        rule_count=count_of(apps.get_model('myapp', 'RuleTheory').objects, 'difficulty'),
+        problem_count=count_of(apps.get_model('myapp', 'Problem').objects, 'difficulty'),
+    )
+
+    counters = {}
+    for field in ('terms_studied', 'rules_studied', 'problems_solved'):
+        through = UserProgress._meta.get_field(field).remote_field.through
+        counters[f'{field}_count'] = count_of(through.objects, 'userprogress')
+    UserProgress.objects.update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='difficultylevel',
+            name='problem_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='difficultylevel',
+            name='rule_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='difficultylevel',
+            name='term_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='problems_solved_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='rules_studied_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='terms_studied_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
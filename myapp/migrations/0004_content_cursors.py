@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term_position', models.BigIntegerField(default=0)),
+                ('rule_position', models.BigIntegerField(default=0)),
+                ('problem_position', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['difficulty', 'id'], name='myapp_probl_difficu_c4a03e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ruletheory',
+            index=models.Index(fields=['difficulty', 'id'], name='myapp_rulet_difficu_52216e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='term',
+            index=models.Index(fields=['difficulty', 'id'], name='myapp_term_difficu_737c3d_idx'),
+        ),
+        migrations.AddField(
+            model_name='contentcursor',
+            name='level',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.difficultylevel'),
+        ),
+        migrations.AddField(
+            model_name='contentcursor',
+            name='user_progress',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cursors', to='myapp.userprogress'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='contentcursor',
+            unique_together={('user_progress', 'level')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_content_cursors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlacementSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(default=dict)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placement_submissions', to='myapp.userprogress')),
+            ],
+        ),
+    ]
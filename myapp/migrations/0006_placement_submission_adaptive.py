@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_placement_submissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placementsubmission',
+            name='adaptive',
+            field=models.BooleanField(default=False),
+        ),
+    ]
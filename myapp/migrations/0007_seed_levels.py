@@ -0,0 +1,26 @@
+from django.db import migrations
+
+LEVEL_NAMES = {
+    1: "Beginner",
+    2: "Elementary",
+    3: "Intermediate",
+    4: "Advanced",
+    5: "Expert",
+}
+
+
+def seed_levels(apps, schema_editor):
+    DifficultyLevel = apps.get_model('myapp', 'DifficultyLevel')
+    for level, name in LEVEL_NAMES.items():
+        DifficultyLevel.objects.get_or_create(level=level, defaults={'name': name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_placement_submission_adaptive'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    SiteCounter = apps.get_model('myapp', 'SiteCounter')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProgress = apps.get_model('myapp', 'UserProgress')
+
+    SiteCounter.objects.create(name='learners', value=User.objects.count())
+    per_level = dict(
+        UserProgress.objects.values_list('current_level__level').annotate(n=Count('id')).order_by()
+    )
+    for level in range(1, 6):
+        SiteCounter.objects.create(name=f'learners_level_{level}', value=per_level.get(level, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_seed_levels'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+import myapp.models
+
+CONTENT_MODELS = {
+    'term': 'term',
+    'ruletheory': 'rule',
+    'problem': 'problem',
+    'testquestion': 'test_question',
+}
+
+
+def fill_external_ids(apps, schema_editor):
+    # Existing rows get a readable id derived from their primary key
+    for model_name, prefix in CONTENT_MODELS.items():
+        model = apps.get_model('myapp', model_name)
+        rows = list(model.objects.filter(external_id__isnull=True).only('id'))
+        for row in rows:
+            row.external_id = f'{prefix}-{row.id}'
+        model.objects.bulk_update(rows, ['external_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_site_counters'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='external_id',
+                field=models.CharField(max_length=100, null=True),
+            )
+            for model_name in CONTENT_MODELS
+        ],
+        migrations.RunPython(fill_external_ids, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name='external_id',
+                field=models.CharField(default=myapp.models.new_external_id, max_length=100, unique=True),
+            )
+            for model_name in CONTENT_MODELS
+        ],
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_content_external_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ruletheory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='term',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='testquestion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_slots(apps, schema_editor):
+    # Existing items get dense slots per level in the order learners meet them
+    for model_name in ('term', 'ruletheory', 'problem'):
+        model = apps.get_model('myapp', model_name)
+        rows = list(model.objects.order_by('difficulty_id', 'id').only('id', 'difficulty_id'))
+        next_slot = {}
+        for row in rows:
+            row.slot = next_slot.get(row.difficulty_id, 0)
+            next_slot[row.difficulty_id] = row.slot + 1
+        model.objects.bulk_update(rows, ['slot'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ruletheory',
+            name='slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='term',
+            name='slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_slots, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='problem',
+            unique_together={('difficulty', 'slot')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='ruletheory',
+            unique_together={('difficulty', 'slot')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='term',
+            unique_together={('difficulty', 'slot')},
+        ),
+        migrations.CreateModel(
+            name='StudiedBitset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_type', models.CharField(max_length=10)),
+                ('bits', models.BinaryField(default=b'')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.difficultylevel')),
+                ('user_progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bitsets', to='myapp.userprogress')),
+            ],
+            options={
+                'unique_together': {('user_progress', 'level', 'content_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_studied_bitsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('metric', models.CharField(max_length=10)),
+                ('level', models.PositiveSmallIntegerField()),
+                ('key', models.CharField(blank=True, max_length=10)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('day', 'metric', 'level', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('kind', models.CharField(max_length=10)),
+                ('level', models.PositiveSmallIntegerField()),
+                ('key', models.CharField(blank=True, max_length=10)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('user_progress', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='myapp.userprogress')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LearnerDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('terms', models.PositiveIntegerField(default=0)),
+                ('rules', models.PositiveIntegerField(default=0)),
+                ('problems', models.PositiveIntegerField(default=0)),
+                ('answered', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('user_progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='myapp.userprogress')),
+            ],
+            options={
+                'unique_together': {('user_progress', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+def fill_question_ids(apps, schema_editor):
+    # Which questions older submissions were given was never stored; the
+    # ones they answered are the closest record left
+    PlacementSubmission = apps.get_model('myapp', 'PlacementSubmission')
+    batch = []
+    for submission in PlacementSubmission.objects.only('id', 'answers').iterator(chunk_size=1000):
+        submission.question_ids = sorted(int(k) for k in submission.answers)
+        batch.append(submission)
+        if len(batch) >= 1000:
+            PlacementSubmission.objects.bulk_update(batch, ['question_ids'])
+            batch = []
+    PlacementSubmission.objects.bulk_update(batch, ['question_ids'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placementsubmission',
+            name='question_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(fill_question_ids, migrations.RunPython.noop),
+    ]
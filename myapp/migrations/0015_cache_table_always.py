@@ -0,0 +1,25 @@
+from django.core.management.commands.createcachetable import Command as CreateCacheTable
+from django.db import migrations
+
+# LOCATION to use with CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+CACHE_TABLE = 'clario_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    # 0013 only created it when CACHES used the database cache at migrate
+    # time, so a database migrated under another cache had none. Made here
+    # whatever the settings say; existing tables are left alone.
+    command = CreateCacheTable()
+    command.verbosity = 0
+    command.create_table(schema_editor.connection.alias, CACHE_TABLE, dry_run=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_placement_question_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
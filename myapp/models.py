@@ -1,6 +1,12 @@
-from django.db import models
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 class DifficultyLevel(models.Model):
     level = models.IntegerField(
@@ -8,6 +14,10 @@ class DifficultyLevel(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(5)]
     )
     name = models.CharField(max_length=50, blank=True)
+    # Number of items at this level, kept current by myapp/signals.py
+    term_count = models.PositiveIntegerField(default=0)
+    rule_count = models.PositiveIntegerField(default=0)
+    problem_count = models.PositiveIntegerField(default=0)
     
     def save(self, *args, **kwargs):
         if not self.name:
@@ -23,24 +33,88 @@ class DifficultyLevel(models.Model):
     
     def __str__(self):
         return f"Level {self.level}: {self.name}"
+    
+    @property
+    def total_items(self):
+        return self.term_count + self.rule_count + self.problem_count
+    
+    @classmethod
+    def refresh_totals(cls):
+        """Recount the items of every level in a single UPDATE"""
+        def count_of(model):
+            counts = model.objects.filter(difficulty=OuterRef('pk')).order_by().values('difficulty')
+            return Coalesce(Subquery(counts.annotate(c=Count('*')).values('c')), 0)
+        
+        cls.objects.update(
+            term_count=count_of(Term),
+            rule_count=count_of(RuleTheory),
+            problem_count=count_of(Problem),
+        )
+
+def new_external_id():
+    return uuid.uuid4().hex
+
+class SlottedContent:
+    """Retries save() when another item took the same slot in the meantime.
+
+    New and moved items get Max(slot) + 1 of their level (see
+    myapp/bitsets.py), so two saved at once can pick the same slot; the
+    unique (difficulty, slot) pair turns that into an IntegrityError and the
+    slot is simply picked again.
+    """
+    SLOT_RETRIES = 5
+    
+    def save(self, *args, **kwargs):
+        for attempt in range(self.SLOT_RETRIES):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == self.SLOT_RETRIES - 1 or not getattr(self, '_slot_assigned', False) or not (
+                    type(self).objects.filter(difficulty_id=self.difficulty_id, slot=self.slot).exclude(pk=self.pk).exists()
+                ):
+                    raise
+                self.slot = None
 
-class Term(models.Model):
+class Term(SlottedContent, models.Model):
     title = models.CharField(max_length=200)
     explanation = models.TextField()
     difficulty = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    # Stable key for bulk import/export, see import_content
+    external_id = models.CharField(max_length=100, unique=True, default=new_external_id)
+    # Validator for conditional GETs, see learning_content
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bit of this item in StudiedBitset rows of its level, set by myapp/signals.py
+    slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        # Learners walk each level in id order, see myapp/progression.py
+        indexes = [models.Index(fields=['difficulty', 'id'])]
+        unique_together = ('difficulty', 'slot')
     
     def __str__(self):
         return self.title
 
-class RuleTheory(models.Model):
+class RuleTheory(SlottedContent, models.Model):
     title = models.CharField(max_length=200)
     explanation = models.TextField()
     difficulty = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    # Stable key for bulk import/export, see import_content
+    external_id = models.CharField(max_length=100, unique=True, default=new_external_id)
+    # Validator for conditional GETs, see learning_content
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bit of this item in StudiedBitset rows of its level, set by myapp/signals.py
+    slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        # Learners walk each level in id order, see myapp/progression.py
+        indexes = [models.Index(fields=['difficulty', 'id'])]
+        unique_together = ('difficulty', 'slot')
     
     def __str__(self):
         return self.title
 
-class Problem(models.Model):
+class Problem(SlottedContent, models.Model):
     question = models.TextField()
     option_a = models.CharField(max_length=200)
     option_b = models.CharField(max_length=200)
@@ -54,6 +128,17 @@ class Problem(models.Model):
     ])
     explanation = models.TextField()
     difficulty = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    # Stable key for bulk import/export, see import_content
+    external_id = models.CharField(max_length=100, unique=True, default=new_external_id)
+    # Validator for conditional GETs, see learning_content
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bit of this item in StudiedBitset rows of its level, set by myapp/signals.py
+    slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        # Learners walk each level in id order, see myapp/progression.py
+        indexes = [models.Index(fields=['difficulty', 'id'])]
+        unique_together = ('difficulty', 'slot')
     
     def __str__(self):
         return self.question[:50] + "..." if len(self.question) > 50 else self.question
@@ -72,28 +157,194 @@ class TestQuestion(models.Model):
     ])
     explanation = models.TextField()
     difficulty = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    # Stable key for bulk import/export, see import_content
+    external_id = models.CharField(max_length=100, unique=True, default=new_external_id)
+    # Validator for conditional GETs, see learning_content
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.question[:50] + "..." if len(self.question) > 50 else self.question
 
 class UserProgress(models.Model):
+    # M2M field -> stored counter, kept exact by the m2m_changed receivers in myapp/signals.py
+    COUNTER_FIELDS = {
+        'terms_studied': 'terms_studied_count',
+        'rules_studied': 'rules_studied_count',
+        'problems_solved': 'problems_solved_count',
+    }
+    
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     current_level = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
     terms_studied = models.ManyToManyField(Term, blank=True)
     rules_studied = models.ManyToManyField(RuleTheory, blank=True)
     problems_solved = models.ManyToManyField(Problem, blank=True)
+    terms_studied_count = models.PositiveIntegerField(default=0)
+    rules_studied_count = models.PositiveIntegerField(default=0)
+    problems_solved_count = models.PositiveIntegerField(default=0)
     placement_test_taken = models.BooleanField(default=False)
     placement_test_score = models.FloatField(default=0)
     
     def __str__(self):
         return f"{self.user.username}'s Progress"
     
+    @property
+    def items_completed(self):
+        return self.terms_studied_count + self.rules_studied_count + self.problems_solved_count
+    
+    @property
+    def has_started_learning(self):
+        return self.placement_test_taken or self.items_completed > 0
+    
+    # Filled by studied_ids on first use
+    _studied_ids = None
+    
+    @property
+    def studied_ids(self):
+        """content type -> set of studied item ids, loaded on first use"""
+        from .recording import load_studied_ids
+        
+        if self._studied_ids is None:
+            self._studied_ids = load_studied_ids(self)
+        return self._studied_ids
+    
     def get_progress_percentage(self):
         """Calculate overall progress through all levels"""
-        total_possible = 100  # This could be more sophisticated
-        items_completed = (
-            self.terms_studied.count() + 
-            self.rules_studied.count() + 
-            self.problems_solved.count()
-        )
-        return min((items_completed / total_possible * 100), 100) if total_possible > 0 else 0
\ No newline at end of file
+        from .levels import all_levels
+        
+        total_possible = sum(level.total_items for level in all_levels())
+        return min((self.items_completed / total_possible * 100), 100) if total_possible > 0 else 0
+    
+    @classmethod
+    def recount(cls, queryset=None):
+        """Recount the stored counters from the studied items, returns rows updated"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        counters = {}
+        if settings.STUDIED_STORAGE == 'bitset':
+            for content_type, counter in (('term', 'terms_studied_count'), ('rule', 'rules_studied_count'),
+                                          ('problem', 'problems_solved_count')):
+                counts = StudiedBitset.objects.filter(
+                    user_progress=OuterRef('pk'), content_type=content_type
+                ).order_by().values('user_progress')
+                counters[counter] = Coalesce(Subquery(counts.annotate(c=Sum('count')).values('c')), 0)
+            return queryset.update(**counters)
+        for field, counter in cls.COUNTER_FIELDS.items():
+            through = cls._meta.get_field(field).remote_field.through
+            counts = through.objects.filter(userprogress=OuterRef('pk')).order_by().values('userprogress')
+            counters[counter] = Coalesce(Subquery(counts.annotate(c=Count('*')).values('c')), 0)
+        return queryset.update(**counters)
+
+
+class ContentCursor(models.Model):
+    """How far a learner has walked through one level, per content type.
+
+    Every item at the level with an id up to the stored position is known to
+    be studied (or gone), so the next item is found by an index range scan
+    starting right after it instead of excluding the whole studied set.
+    """
+    user_progress = models.ForeignKey(UserProgress, on_delete=models.CASCADE, related_name='cursors')
+    level = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    term_position = models.BigIntegerField(default=0)
+    rule_position = models.BigIntegerField(default=0)
+    problem_position = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user_progress', 'level')
+    
+    def __str__(self):
+        return f"{self.user_progress.user.username} @ level {self.level.level}"
+
+
+class StudiedBitset(models.Model):
+    """Which items of one type and level a learner has studied, one bit per slot.
+
+    Replaces the M2M through tables when STUDIED_STORAGE is "bitset", see
+    myapp/bitsets.py. A learner has at most a few of these rows however much
+    they study.
+    """
+    user_progress = models.ForeignKey(UserProgress, on_delete=models.CASCADE, related_name='bitsets')
+    level = models.ForeignKey(DifficultyLevel, on_delete=models.CASCADE)
+    content_type = models.CharField(max_length=10)
+    bits = models.BinaryField(default=b'')
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user_progress', 'level', 'content_type')
+    
+    def __str__(self):
+        return f"{self.user_progress.user.username}: {self.count} {self.content_type}s @ level {self.level.level}"
+
+
+class PlacementSubmission(models.Model):
+    """Answers given in one placement test, kept so tests can be re-scored"""
+    user_progress = models.ForeignKey(UserProgress, on_delete=models.CASCADE, related_name='placement_submissions')
+    answers = models.JSONField(default=dict)
+    # Ids of the questions the learner was given, the only ones a re-score counts
+    question_ids = models.JSONField(default=list)
+    correct = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    adaptive = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.user_progress.user.username}: {self.score:.1f}%"
+
+
+class SiteCounter(models.Model):
+    """Running totals shown on public pages, see myapp/stats.py, and the
+    analytics rollup watermark, see myapp/analytics.py"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class ProgressEvent(models.Model):
+    """Append-only log of learning events, the source of the analytics rollups.
+
+    See myapp/analytics.py for the kinds and what level and key hold. Rows
+    outlive their learner so site-wide numbers can always be rebuilt.
+    """
+    user_progress = models.ForeignKey(UserProgress, on_delete=models.SET_NULL, null=True, related_name='events')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    kind = models.CharField(max_length=10)
+    level = models.PositiveSmallIntegerField()
+    key = models.CharField(max_length=10, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.kind} {self.key} x{self.count} @ level {self.level}"
+
+
+class LearnerDay(models.Model):
+    """What one learner studied and answered on one day"""
+    user_progress = models.ForeignKey(UserProgress, on_delete=models.CASCADE, related_name='days')
+    day = models.DateField()
+    terms = models.PositiveIntegerField(default=0)
+    rules = models.PositiveIntegerField(default=0)
+    problems = models.PositiveIntegerField(default=0)
+    answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user_progress', 'day')
+    
+    def __str__(self):
+        return f"{self.user_progress.user.username} on {self.day}"
+
+
+class DailyRollup(models.Model):
+    """Site-wide sum of one kind of ProgressEvent per day, level and key"""
+    day = models.DateField()
+    metric = models.CharField(max_length=10)
+    level = models.PositiveSmallIntegerField()
+    key = models.CharField(max_length=10, blank=True)
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('day', 'metric', 'level', 'key')
+    
+    def __str__(self):
+        return f"{self.day} {self.metric} {self.key} @ level {self.level} = {self.value}"
@@ -0,0 +1,204 @@
+import random
+
+from django.core.cache import cache
+
+from .models import PlacementSubmission, TestQuestion
+from .routers import primary
+
+ANSWER_KEY_CACHE_KEY = 'placement:answer_key'
+LEVEL_POOLS_CACHE_KEY = 'placement:level_pools'
+# Invalidated on every TestQuestion change; the timeout only bounds how long
+# a copy can outlive an invalidation it missed
+ANSWER_KEY_CACHE_SECONDS = 60 * 60
+
+# Adaptive test tuning
+MIN_LEVEL = 1
+MAX_LEVEL = 5
+START_ABILITY = 3.0
+START_STEP = 1.0
+MIN_STEP = 0.3
+STEP_DECAY = 0.7
+MIN_QUESTIONS = 5
+MAX_QUESTIONS = 12
+# Stop once the estimated level has not moved for this many answers
+STABLE_ANSWERS = 3
+
+# Lowest score (in %) needed for each level, checked from the top
+LEVEL_BANDS = [
+    (80, 5),  # Only 80-100% gets level 5
+    (60, 4),
+    (40, 3),
+    (20, 2),
+    (0, 1),
+]
+
+
+def get_answer_key():
+    """Map of test question id -> correct letter.
+
+    Only two columns are read, and the result is cached in the shared cache
+    until a TestQuestion changes (see myapp/signals.py).
+    """
+    key = cache.get(ANSWER_KEY_CACHE_KEY)
+    if key is None:
+        with primary():
+            key = dict(TestQuestion.objects.values_list('id', 'correct_answer'))
+        cache.set(ANSWER_KEY_CACHE_KEY, key, ANSWER_KEY_CACHE_SECONDS)
+    return key
+
+
+def get_level_pools():
+    """Map of level number -> ids of the test questions at that level"""
+    pools = cache.get(LEVEL_POOLS_CACHE_KEY)
+    if pools is None:
+        pools = {}
+        with primary():
+            rows = list(TestQuestion.objects.values_list('id', 'difficulty__level').order_by('id'))
+        for question_id, level_num in rows:
+            pools.setdefault(level_num, []).append(question_id)
+        cache.set(LEVEL_POOLS_CACHE_KEY, pools, ANSWER_KEY_CACHE_SECONDS)
+    return pools
+
+
+def invalidate_answer_key():
+    cache.delete_many([ANSWER_KEY_CACHE_KEY, LEVEL_POOLS_CACHE_KEY])
+
+
+def answers_from_post(data):
+    """Pull {question_id: letter} out of the submitted question_<id> fields"""
+    answers = {}
+    for name, value in data.items():
+        if not name.startswith('question_'):
+            continue
+        try:
+            question_id = int(name[len('question_'):])
+        except ValueError:
+            continue
+        answers[question_id] = value.strip().upper()
+    return answers
+
+
+def grade(answers, answer_key=None):
+    """Score one submission against the answer key, returns (correct, total)"""
+    if answer_key is None:
+        answer_key = get_answer_key()
+    correct = sum(1 for question_id, letter in answer_key.items() if answers.get(question_id) == letter)
+    return correct, len(answer_key)
+
+
+def score_percentage(correct, total):
+    return (correct / total) * 100 if total > 0 else 0
+
+
+def level_for_score(score):
+    for minimum, level_num in LEVEL_BANDS:
+        if score >= minimum:
+            return level_num
+    return 1
+
+
+def regrade_all(batch_size=1000):
+    """Re-score every stored submission against the current answer key.
+
+    Only the questions the learner was given count, minus any deleted since,
+    so questions added later never turn into wrong answers. Submissions are
+    streamed in batches and written back with bulk_update, returns the
+    number of submissions whose score changed.
+    """
+    answer_key = get_answer_key()
+    changed = 0
+    batch = []
+    fields = ('id', 'answers', 'question_ids', 'correct', 'total', 'score')
+    for submission in PlacementSubmission.objects.only(*fields).iterator(chunk_size=batch_size):
+        # JSON object keys come back as strings
+        answers = {int(k): v for k, v in submission.answers.items()}
+        asked = {k: answer_key[k] for k in submission.question_ids if k in answer_key}
+        correct, total = grade(answers, asked)
+        if (correct, total) == (submission.correct, submission.total):
+            continue
+        submission.correct = correct
+        submission.total = total
+        submission.score = score_percentage(correct, total)
+        batch.append(submission)
+        if len(batch) >= batch_size:
+            PlacementSubmission.objects.bulk_update(batch, ['correct', 'total', 'score'])
+            changed += len(batch)
+            batch = []
+    if batch:
+        PlacementSubmission.objects.bulk_update(batch, ['correct', 'total', 'score'])
+        changed += len(batch)
+    return changed
+
+
+class AdaptiveTest:
+    """Placement test that asks one question at a time.
+
+    Each answer moves the ability estimate up or down by a shrinking step,
+    and the next question is drawn from the level closest to it. The test
+    stops once the estimated level has settled or after MAX_QUESTIONS. State is a plain dict so it can live in the session.
+    """
+
+    def __init__(self, state=None):
+        self.state = state or {
+            'ability': START_ABILITY,
+            'step': START_STEP,
+            'answers': {},
+            'levels': [],
+            'current': None,
+        }
+
+    @property
+    def answers(self):
+        return {int(k): v for k, v in self.state['answers'].items()}
+
+    @property
+    def question_number(self):
+        return len(self.state['answers']) + 1
+
+    @property
+    def level(self):
+        return min(max(round(self.state['ability']), MIN_LEVEL), MAX_LEVEL)
+
+    def next_question_id(self):
+        """Pick (and remember) a random unasked question near the estimate"""
+        if self.state['current'] is not None:
+            return self.state['current']
+
+        pools = get_level_pools()
+        asked = set(self.answers)
+        target = self.level
+        # Closest level first, then further away on either side
+        for level_num in sorted(range(MIN_LEVEL, MAX_LEVEL + 1), key=lambda n: (abs(n - target), n)):
+            remaining = [i for i in pools.get(level_num, []) if i not in asked]
+            if remaining:
+                self.state['current'] = random.choice(remaining)
+                return self.state['current']
+        return None
+
+    def answer(self, letter, answer_key=None):
+        """Record the answer to the current question, returns whether it was right"""
+        if answer_key is None:
+            answer_key = get_answer_key()
+        question_id = self.state['current']
+        is_correct = answer_key.get(question_id) == letter
+        self.state['answers'][str(question_id)] = letter
+        self.state['current'] = None
+
+        if is_correct:
+            self.state['ability'] += self.state['step']
+        else:
+            self.state['ability'] -= self.state['step']
+        self.state['ability'] = min(max(self.state['ability'], MIN_LEVEL), MAX_LEVEL)
+        self.state['step'] = max(self.state['step'] * STEP_DECAY, MIN_STEP)
+        self.state['levels'].append(self.level)
+        return is_correct
+
+    @property
+    def finished(self):
+        asked = len(self.state['answers'])
+        if asked >= MAX_QUESTIONS:
+            return True
+        recent = self.state['levels'][-STABLE_ANSWERS:]
+        if asked >= MIN_QUESTIONS and len(set(recent)) == 1:
+            return True
+        return self.next_question_id() is None
@@ -0,0 +1,149 @@
+import bisect
+
+from . import bitsets, recording
+from .catalog import get_catalog
+from .levels import get_level, get_level_by_id
+from .models import ContentCursor, Problem, RuleTheory, Term, UserProgress
+
+# content type -> (model, UserProgress M2M field, ContentCursor position field)
+CONTENT_TYPES = {
+    'term': (Term, 'terms_studied', 'term_position'),
+    'rule': (RuleTheory, 'rules_studied', 'rule_position'),
+    'problem': (Problem, 'problems_solved', 'problem_position'),
+}
+
+MAX_LEVEL = 5
+
+# How many upcoming items to check against the studied set per query
+CANDIDATE_BATCH = 20
+
+
+def get_cursor(user_progress, level):
+    cursor, created = ContentCursor.objects.get_or_create(user_progress=user_progress, level=level)
+    cursor.level = level
+    return cursor
+
+
+def next_item(user_progress, cursor, content_type, studied=None):
+    """First item after the cursor that the learner has not studied yet.
+
+    Candidates come from the level's cached catalog in id order; one query on
+    the through table tells which of the next few are already studied, or,
+    given the learner's Bitset for the level, no query at all. Items before
+    the cursor are never looked at again, so the cost does not grow with the
+    learner's history.
+    """
+    model, field, position_field = CONTENT_TYPES[content_type]
+    position = getattr(cursor, position_field)
+    catalog = get_catalog(cursor.level_id)
+    ids = catalog.ids[content_type]
+
+    through = UserProgress._meta.get_field(field).remote_field.through
+    fk = f'{model._meta.model_name}_id'
+
+    item = None
+    start = bisect.bisect_right(ids, position)
+    if studied is not None:
+        items = catalog.items[content_type]
+        item = next((items[i] for i in ids[start:] if items[i].slot not in studied), None)
+        start = len(ids)
+    elif user_progress._studied_ids is not None:
+        # Already loaded for this request, no need to ask the database
+        done = user_progress._studied_ids[content_type]
+        item = next((catalog.get(content_type, i) for i in ids[start:] if i not in done), None)
+        start = len(ids)
+    while start < len(ids):
+        candidates = ids[start:start + CANDIDATE_BATCH]
+        studied = set(through.objects.filter(
+            userprogress=user_progress, **{f'{fk}__in': candidates}
+        ).values_list(fk, flat=True))
+        next_id = next((i for i in candidates if i not in studied), None)
+        if next_id is not None:
+            item = catalog.get(content_type, next_id)
+            break
+        start += CANDIDATE_BATCH
+
+    if item is not None:
+        # Everything before this item is done, move the cursor up to it
+        if item.id - 1 > position:
+            ContentCursor.objects.filter(pk=cursor.pk).update(**{position_field: item.id - 1})
+            setattr(cursor, position_field, item.id - 1)
+    return item
+
+
+def pick_content(user_progress, cursor):
+    """Choose what to show next at the cursor's level, or (None, None)"""
+    terms_studied_count = user_progress.terms_studied_count
+    rules_studied_count = user_progress.rules_studied_count
+
+    # Determine what to show next based on progression logic
+    if terms_studied_count % 5 == 0 and terms_studied_count > 0 and rules_studied_count < (terms_studied_count // 5):
+        # Show a rule/theory after every 5 terms
+        content_type = 'rule'
+    elif (terms_studied_count % 10 == 0 and terms_studied_count > 0 and
+          rules_studied_count % 2 == 0 and rules_studied_count > 0):
+        # Show a problem after every 10 terms and 2 rules
+        content_type = 'problem'
+    else:
+        # Show a term by default
+        content_type = 'term'
+    # With bitset storage the whole level's studied sets are one small query
+    studied = {}
+    if recording.reads_bitsets():
+        studied = bitsets.load(user_progress.pk, cursor.level_id)
+    content = next_item(user_progress, cursor, content_type, studied.get(content_type))
+
+    # If no content of the determined type, try other types
+    if not content:
+        if content_type == 'term':
+            content = next_item(user_progress, cursor, 'rule', studied.get('rule'))
+            content_type = 'rule' if content else None
+
+        if not content:
+            content = next_item(user_progress, cursor, 'problem', studied.get('problem'))
+            content_type = 'problem' if content else None
+
+    return content_type, content
+
+
+def next_content(user_progress):
+    """Next item for the learner, moving them up a level when theirs is done.
+
+    Returns (content_type, content), both None when there is nothing left.
+    """
+    while True:
+        current_level = get_level_by_id(user_progress.current_level_id)
+        user_progress.current_level = current_level
+        cursor = get_cursor(user_progress, current_level)
+        content_type, content = pick_content(user_progress, cursor)
+        if content or current_level.level >= MAX_LEVEL:
+            return content_type, content
+
+        next_level = get_level(current_level.level + 1)
+        user_progress.current_level = next_level
+        user_progress.save(update_fields=['current_level'])
+
+
+def rewind_cursors(content_type, item):
+    """Make sure cursors at the item's level have not already passed it.
+
+    New items always get a higher id than any cursor, but an existing item
+    moved to another level may land behind learners who are further along.
+    """
+    model, field, position_field = CONTENT_TYPES[content_type]
+    ContentCursor.objects.filter(
+        level_id=item.difficulty_id, **{f'{position_field}__gte': item.id}
+    ).update(**{position_field: item.id - 1})
+
+
+def unstudy(content_type, user_progress_ids, item_ids=None):
+    """Move the learners' cursors back behind items taken out of their studied set.
+
+    Cursors assume studied sets only grow, so after a remove() or clear()
+    they are rewound to just before the lowest removed id, at every level
+    to keep it simple. item_ids None means all items of the type.
+    """
+    model, field, position_field = CONTENT_TYPES[content_type]
+    cursors = ContentCursor.objects.filter(user_progress_id__in=user_progress_ids)
+    position = min(item_ids) - 1 if item_ids is not None else 0
+    cursors.filter(**{f'{position_field}__gt': position}).update(**{position_field: position})
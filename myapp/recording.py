@@ -0,0 +1,265 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+
+from . import analytics, bitsets, snapshots
+from .catalog import get_catalog
+from .models import StudiedBitset, UserProgress
+
+# content type -> UserProgress M2M field
+STUDIED_FIELDS = {
+    'term': 'terms_studied',
+    'rule': 'rules_studied',
+    'problem': 'problems_solved',
+}
+
+
+def through_model(content_type):
+    return UserProgress._meta.get_field(STUDIED_FIELDS[content_type]).remote_field.through
+
+
+def item_column(content_type):
+    """Column of the through table pointing at the content item, e.g. term_id"""
+    field = UserProgress._meta.get_field(STUDIED_FIELDS[content_type])
+    return f'{field.related_model._meta.model_name}_id'
+
+
+# Where studied items are kept (settings.STUDIED_STORAGE):
+#   "through"  the M2M through tables, as originally
+#   "dual"     the through tables, with bitsets written alongside; run
+#              backfill_studied_bitsets in this mode before switching
+#   "bitset"   StudiedBitset rows only, see myapp/bitsets.py
+def writes_through():
+    return settings.STUDIED_STORAGE != 'bitset'
+
+
+def writes_bitsets():
+    return settings.STUDIED_STORAGE != 'through'
+
+
+def reads_bitsets():
+    return settings.STUDIED_STORAGE == 'bitset'
+
+
+def load_studied_ids(user_progress):
+    """content type -> set of the learner's studied ids, in one query"""
+    studied = {content_type: set() for content_type in STUDIED_FIELDS}
+    if reads_bitsets():
+        rows = StudiedBitset.objects.filter(user_progress_id=user_progress.pk).values_list('content_type', 'level_id', 'bits')
+        for content_type, level_id, bits in rows:
+            bits = bitsets.Bitset(bits)
+            items = get_catalog(level_id).items[content_type]
+            studied[content_type].update(obj_id for obj_id, obj in items.items() if obj.slot in bits)
+        return studied
+
+    queries = [
+        through_model(content_type).objects.filter(userprogress_id=user_progress.pk)
+        .annotate(kind=Value(content_type)).values_list(item_column(content_type), 'kind')
+        for content_type in STUDIED_FIELDS
+    ]
+    for obj_id, content_type in queries[0].union(*queries[1:], all=True):
+        studied[content_type].add(obj_id)
+    return studied
+
+
+def add_through(user_progress, content_type, item):
+    """Insert the learner's through row, returns False if it was already there.
+
+    This skips m2m_changed and bumps the counter itself, which also tells us
+    whether the item was new. The row, the counter and the analytics event
+    are written in one transaction.
+    """
+    try:
+        with transaction.atomic():
+            through_model(content_type).objects.create(
+                userprogress_id=user_progress.pk, **{item_column(content_type): item.id}
+            )
+            counter = UserProgress.COUNTER_FIELDS[STUDIED_FIELDS[content_type]]
+            UserProgress.objects.filter(pk=user_progress.pk).update(**{counter: F(counter) + 1})
+            # Through rows are what's read whenever they are written
+            analytics.record(user_progress.pk, [analytics.studied(content_type, item.difficulty_id)])
+    except IntegrityError:
+        return False
+    snapshots.invalidate(user_progress.user_id)
+    return True
+
+
+def add_bit(user_progress, content_type, item):
+    """Set the item's bit, returns True if it was new.
+
+    When bitsets are what's read, the analytics event is logged in the same
+    transaction.
+    """
+    with transaction.atomic():
+        new_bit = bitsets.add(user_progress.pk, content_type, item.difficulty_id, [item.slot], update_counter=reads_bitsets())
+        if new_bit and reads_bitsets():
+            analytics.record(user_progress.pk, [analytics.studied(content_type, item.difficulty_id)])
+    if new_bit:
+        snapshots.invalidate(user_progress.user_id)
+    return bool(new_bit)
+
+
+def record(user_progress, content_type, item):
+    """Add one item to a learner's studied set, returns True if it was new"""
+    if user_progress._studied_ids is not None:
+        user_progress._studied_ids[content_type].add(item.id)
+    added = False
+    if writes_through():
+        added = add_through(user_progress, content_type, item)
+    if writes_bitsets():
+        new_bit = add_bit(user_progress, content_type, item)
+        if reads_bitsets():
+            added = new_bit
+    return added
+
+
+def record_answer(user_progress, problem, is_correct):
+    """Log an answered problem for the analytics"""
+    analytics.record(user_progress.pk, [analytics.answered(problem.difficulty_id, is_correct)])
+
+
+async def arecord(user_progress, content_type, item):
+    """Add one item to a learner's studied set from an async view.
+
+    The item, its counter and its analytics event go in one transaction,
+    which the async ORM can't open, so each write runs in a thread: the same
+    add_through and add_bit as record(). Returns True if the item was new
+    for the learner.
+    """
+    added = False
+    if writes_bitsets():
+        added = await sync_to_async(add_bit)(user_progress, content_type, item)
+    if writes_through():
+        added = await sync_to_async(add_through)(user_progress, content_type, item)
+    return added
+
+
+# Event names accepted by record_events -> content type
+EVENT_TYPES = {
+    'term_studied': 'term',
+    'rule_studied': 'rule',
+    'problem_answered': 'problem',
+}
+
+MAX_EVENTS = 200
+
+
+class InvalidEvents(ValueError):
+    pass
+
+
+def parse_events(events):
+    """Validate the shape of a batch, returns [(content_type, id, answer)]"""
+    if not isinstance(events, list):
+        raise InvalidEvents('events must be a list')
+    if len(events) > MAX_EVENTS:
+        raise InvalidEvents(f'at most {MAX_EVENTS} events per batch')
+    parsed = []
+    for event in events:
+        if not isinstance(event, dict) or event.get('type') not in EVENT_TYPES:
+            raise InvalidEvents(f'unknown event: {event!r}')
+        try:
+            obj_id = int(event.get('id'))
+        except (TypeError, ValueError):
+            raise InvalidEvents(f'bad id in event: {event!r}')
+        answer = str(event.get('answer', '')).upper()
+        parsed.append((EVENT_TYPES[event['type']], obj_id, answer))
+    return parsed
+
+
+def record_events(user_progress, events):
+    """Apply a batch of progress events in one transaction.
+
+    Ids are checked with one query per content type, and all new through
+    rows of a type go in with a single bulk_create. Problems only count as
+    solved when answered correctly. Returns a summary dict for the client.
+    """
+    requested = {content_type: set() for content_type in STUDIED_FIELDS}
+    for content_type, obj_id, answer in events:
+        requested[content_type].add(obj_id)
+
+    # Validate ids, one query per content type
+    valid = {}
+    answer_key = {}
+    # content type -> id -> (level id, slot), for the bitsets
+    places = {}
+    for content_type, ids in requested.items():
+        if not ids:
+            valid[content_type] = set()
+            continue
+        model = UserProgress._meta.get_field(STUDIED_FIELDS[content_type]).related_model
+        extra = ['correct_answer'] if content_type == 'problem' else []
+        places[content_type] = {}
+        for row in model.objects.filter(id__in=ids).values('id', 'difficulty_id', 'slot', *extra):
+            places[content_type][row['id']] = (row['difficulty_id'], row['slot'])
+            if content_type == 'problem':
+                answer_key[row['id']] = row['correct_answer']
+        valid[content_type] = set(places[content_type])
+
+    to_add = {content_type: set() for content_type in STUDIED_FIELDS}
+    problems = []
+    invalid = []
+    for content_type, obj_id, answer in events:
+        if obj_id not in valid[content_type]:
+            invalid.append({'type': content_type, 'id': obj_id})
+            continue
+        if content_type == 'problem':
+            is_correct = answer == answer_key[obj_id]
+            problems.append({'id': obj_id, 'is_correct': is_correct, 'correct_answer': answer_key[obj_id]})
+            if not is_correct:
+                continue
+        to_add[content_type].add(obj_id)
+
+    if user_progress._studied_ids is not None:
+        for content_type, ids in to_add.items():
+            user_progress._studied_ids[content_type] |= ids
+
+    added = {}
+    # For the analytics rollups
+    events = [analytics.answered(places['problem'][problem['id']][0], problem['is_correct']) for problem in problems]
+    with transaction.atomic():
+        # Lock the learner's row so concurrent batches can't double count
+        UserProgress.objects.select_for_update().filter(pk=user_progress.pk).exists()
+        counters = {}
+        for content_type, ids in to_add.items():
+            added[content_type] = 0
+            if not ids:
+                continue
+            if writes_bitsets():
+                by_level = {}
+                for obj_id in ids:
+                    level_id, slot = places[content_type][obj_id]
+                    by_level.setdefault(level_id, []).append(slot)
+                new_bits = {
+                    level_id: bitsets.add(user_progress.pk, content_type, level_id, slots, update_counter=reads_bitsets())
+                    for level_id, slots in by_level.items()
+                }
+                if any(new_bits.values()) and reads_bitsets():
+                    snapshots.invalidate(user_progress.user_id)
+                if not writes_through():
+                    added[content_type] = sum(new_bits.values())
+                    events.extend(analytics.studied(content_type, level_id, n) for level_id, n in new_bits.items() if n)
+                    continue
+            through = through_model(content_type)
+            column = item_column(content_type)
+            already = set(through.objects.filter(
+                userprogress_id=user_progress.pk, **{f'{column}__in': ids}
+            ).values_list(column, flat=True))
+            new_ids = ids - already
+            if not new_ids:
+                continue
+            through.objects.bulk_create(
+                [through(userprogress_id=user_progress.pk, **{column: obj_id}) for obj_id in new_ids],
+                ignore_conflicts=True,
+            )
+            added[content_type] = len(new_ids)
+            counter = UserProgress.COUNTER_FIELDS[STUDIED_FIELDS[content_type]]
+            counters[counter] = F(counter) + len(new_ids)
+            events.extend(analytics.studied(content_type, places[content_type][obj_id][0]) for obj_id in new_ids)
+        if counters:
+            UserProgress.objects.filter(pk=user_progress.pk).update(**counters)
+            snapshots.invalidate(user_progress.user_id)
+        analytics.record(user_progress.pk, events)
+
+    return {'added': added, 'problems': problems, 'invalid': invalid}
@@ -0,0 +1,141 @@
+"""Send content reads to read replicas, everything else to the primary.
+
+Replicas come from REPLICA_DATABASE_URLS (see settings). Reads of the
+content models go to a random replica unless the current request is pinned
+to the primary: requests that change data (POST and friends) are pinned from
+the start, any other request once it writes content, and
+PrimaryPinMiddleware keeps a client pinned for REPLICA_PIN_SECONDS after
+such a write with a cookie, so people read what they just wrote even while
+the replicas lag behind.
+
+Data cached under a version (catalogs, the level registry, search and fuzzy
+indexes, the answer key) is loaded inside primary(): a copy read from a
+lagging replica would otherwise be kept until the next change.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models whose reads may be served by a replica
+REPLICA_MODELS = {'myapp.term', 'myapp.ruletheory', 'myapp.problem', 'myapp.testquestion', 'myapp.difficultylevel'}
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Pin:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_pin = contextvars.ContextVar('db_pin', default=None)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def current_pin():
+    pin = _pin.get()
+    if pin is None:
+        # Outside a request, e.g. a management command
+        pin = Pin()
+        _pin.set(pin)
+    return pin
+
+
+def pin_to_primary():
+    """Read from the primary from now on, as if content had been written"""
+    pin = current_pin()
+    pin.pinned = pin.wrote = True
+
+
+@contextmanager
+def primary():
+    """Read everything from the primary inside the block"""
+    pin = current_pin()
+    pinned = pin.pinned
+    pin.pinned = True
+    try:
+        yield
+    finally:
+        pin.pinned = pinned or pin.wrote
+
+
+def is_content(model):
+    # Not label_lower: the database cache routes a stand-in model without it
+    return f'{model._meta.app_label}.{model._meta.model_name}' in REPLICA_MODELS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not is_content(model):
+            return DEFAULT_DB_ALIAS
+        aliases = replicas()
+        # Inside a transaction only the primary sees what it wrote so far
+        if not aliases or current_pin().pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        # Only content is read from replicas, so only content writes pin
+        if is_content(model):
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinMiddleware:
+    """Pin requests to the primary as described above, goes near the top"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pin = Pin(self.pinned_from_start(request))
+        token = _pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin.reset(token)
+        return self.finish(pin, response)
+
+    async def __acall__(self, request):
+        pin = Pin(self.pinned_from_start(request))
+        token = _pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin.reset(token)
+        return self.finish(pin, response)
+
+    def pinned_from_start(self, request):
+        return request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def finish(self, pin, response):
+        if pin.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,243 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connections, router
+from django.utils.html import strip_tags
+
+from .fuzzy import matcher
+from .models import Term, RuleTheory
+from .routers import primary
+from .versions import bump_version, get_version
+
+# Content types that can be searched, keyed by the "type" used in the API
+SEARCH_MODELS = {
+    'term': Term,
+    'rule': RuleTheory,
+}
+
+VERSION_KEY = 'search:version'
+
+SNIPPET_LENGTH = 160
+TITLE_WEIGHT = 3
+
+# Same expression as the GIN index created in migration 0002, keep them in sync
+# or Postgres will stop using the index.
+TSVECTOR_SQL = "to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(explanation, ''))"
+
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'that', 'the', 'to', 'with',
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+def plain_text(html):
+    return ' '.join(strip_tags(html).split())
+
+
+def make_snippet(text, tokens):
+    """Cut a short window of text around the first matching token"""
+    start = 0
+    lowered = text.lower()
+    for token in tokens:
+        pos = lowered.find(token)
+        if pos != -1:
+            start = max(pos - SNIPPET_LENGTH // 4, 0)
+            break
+    snippet = text[start:start + SNIPPET_LENGTH]
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_LENGTH < len(text):
+        snippet = snippet + '…'
+    return snippet
+
+
+class InvertedIndex:
+    """In-memory inverted index used when the database has no full-text search.
+
+    Built lazily on first query and rebuilt when the shared version moves
+    (bumped from myapp/signals.py on content changes), so each worker only
+    pays for the build once per edit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.postings = {}
+        self.sorted_tokens = []
+        self.docs = {}
+
+    def invalidate(self):
+        bump_version(VERSION_KEY)
+
+    def build(self, version):
+        postings = defaultdict(dict)
+        docs = {}
+        with primary():
+            for kind, model in SEARCH_MODELS.items():
+                rows = model.objects.values_list('id', 'title', 'explanation', 'difficulty__level')
+                for obj_id, title, explanation, level in rows.iterator():
+                    key = (kind, obj_id)
+                    body = plain_text(explanation)
+                    docs[key] = (title, body, level)
+                    for token in tokenize(title):
+                        postings[token][key] = postings[token].get(key, 0) + TITLE_WEIGHT
+                    for token in tokenize(body):
+                        postings[token][key] = postings[token].get(key, 0) + 1
+        self.postings = dict(postings)
+        self.sorted_tokens = sorted(self.postings)
+        self.docs = docs
+        self.version = version
+
+    def ensure_built(self):
+        version = get_version(VERSION_KEY)
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.build(version)
+
+    def expand(self, token):
+        """All indexed tokens starting with the given prefix"""
+        i = bisect.bisect_left(self.sorted_tokens, token)
+        matches = []
+        while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(token):
+            matches.append(self.sorted_tokens[i])
+            i += 1
+        return matches
+
+    def search(self, tokens, kinds):
+        self.ensure_built()
+        total_docs = len(self.docs) or 1
+        scores = None
+        # Every query token must match, the last one as a prefix (type-ahead)
+        for i, token in enumerate(tokens):
+            candidates = self.expand(token) if i == len(tokens) - 1 else [token]
+            token_scores = defaultdict(float)
+            for candidate in candidates:
+                docs = self.postings.get(candidate, {})
+                idf = math.log(1 + total_docs / len(docs)) if docs else 0
+                for key, tf in docs.items():
+                    token_scores[key] += tf * idf
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {key: score + token_scores[key] for key, score in scores.items() if key in token_scores}
+            if not scores:
+                return []
+        results = []
+        for (kind, obj_id), score in scores.items():
+            if kind not in kinds:
+                continue
+            title, body, level = self.docs[(kind, obj_id)]
+            results.append({
+                'type': kind,
+                'id': obj_id,
+                'title': title,
+                'level': level,
+                'score': round(score, 4),
+                'body': body,
+            })
+        results.sort(key=lambda r: (-r['score'], r['title'].lower()))
+        return results
+
+
+index = InvertedIndex()
+
+
+def search_connection():
+    # A replica when there is one, see myapp/routers.py
+    return connections[router.db_for_read(Term)]
+
+
+def _postgres_search(tokens, kinds, offset, limit):
+    # Prefix-match the last word so results show up while typing
+    tsquery = ' & '.join(tokens[:-1] + [tokens[-1] + ':*'])
+    parts = []
+    params = []
+    for kind in kinds:
+        table = SEARCH_MODELS[kind]._meta.db_table
+        parts.append(
+            f"SELECT %s AS kind, t.id, t.title, left(t.explanation, 1000) AS body, d.level, "
+            f"ts_rank({TSVECTOR_SQL}, to_tsquery('english'::regconfig, %s)) AS rank "
+            f"FROM {table} t JOIN myapp_difficultylevel d ON d.id = t.difficulty_id "
+            f"WHERE {TSVECTOR_SQL} @@ to_tsquery('english'::regconfig, %s)"
+        )
+        params += [kind, tsquery, tsquery]
+    union = ' UNION ALL '.join(parts)
+    with search_connection().cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM ({union}) AS hits", params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT kind, id, title, body, level, rank FROM ({union}) AS hits "
+            f"ORDER BY rank DESC, lower(title) LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        rows = cursor.fetchall()
+    results = [
+        {
+            'type': kind,
+            'id': obj_id,
+            'title': title,
+            'level': level,
+            'score': round(rank, 4),
+            'body': plain_text(body),
+        }
+        for kind, obj_id, title, body, level, rank in rows
+    ]
+    return total, results
+
+
+def run_search(query, kinds=None, page=1, page_size=20):
+    """Ranked full-text search over terms and rules.
+
+    Returns (total, results) where results only carry title, snippet and level,
+    never the full explanation.
+    """
+    kinds = [k for k in (kinds or SEARCH_MODELS) if k in SEARCH_MODELS]
+    tokens = tokenize(query)
+    if not tokens or not kinds:
+        return 0, []
+
+    offset = (page - 1) * page_size
+    if search_connection().vendor == 'postgresql':
+        total, results = _postgres_search(tokens, kinds, offset, page_size)
+    else:
+        hits = index.search(tokens, kinds)
+        total, results = len(hits), hits[offset:offset + page_size]
+
+    page_results = []
+    for result in results:
+        result = dict(result)
+        result['snippet'] = make_snippet(result.pop('body'), tokens)
+        page_results.append(result)
+    return total, page_results
+
+
+def fuzzy_search(query, kinds=None, limit=20):
+    """Typo-tolerant title matches for queries the full-text search misses.
+
+    Titles come from the in-memory trigram index; only the matched rows are
+    read back for their snippets.
+    """
+    kinds = [k for k in (kinds or SEARCH_MODELS) if k in SEARCH_MODELS]
+    results = matcher.search(query, kinds, limit=limit)
+    tokens = tokenize(query)
+
+    bodies = {}
+    for kind in kinds:
+        ids = [r['id'] for r in results if r['type'] == kind]
+        if ids:
+            rows = SEARCH_MODELS[kind].objects.filter(id__in=ids).values_list('id', 'explanation')
+            bodies.update({(kind, obj_id): explanation for obj_id, explanation in rows})
+
+    for result in results:
+        body = plain_text(bodies.get((result['type'], result['id']), ''))
+        result['snippet'] = make_snippet(body, tokens)
+    return results
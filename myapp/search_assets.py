@@ -0,0 +1,183 @@
+"""Per-level search index files served as static assets.
+
+Each level gets one compact JSON file with the type, id, title and a short
+snippet of every term and rule. The search page uses them for instant
+matches only, since they miss words deeper in explanations; search_api
+stays the source of the results. The file name carries a hash of its
+content, the way the manifest storage names collected files, and .gz/.br
+copies sit next to it. WhiteNoise serves files that exist when it starts
+with far-future caching, so run build_search_index after collectstatic.
+Content changes rebuild the affected level; files written after a worker
+started are served by views.search_index_asset under the same URL. Pages
+only link files that exist, they never build one.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from whitenoise.compress import Compressor, brotli_installed
+
+from . import levels
+from .routers import primary
+from .search import SEARCH_MODELS, SNIPPET_LENGTH, plain_text
+
+INDEX_DIR = 'myapp/search-index'
+NAME_RE = re.compile(r'^level-(\d+)\.[0-9a-f]{12}\.json$')
+NAME_CACHE_KEY = 'search:asset:{level}'
+# Files kept per level, so pages rendered just before a rebuild still load
+KEEP_FILES = 2
+
+
+def level_entries(level):
+    entries = []
+    for kind, model in SEARCH_MODELS.items():
+        rows = model.objects.filter(difficulty=level).order_by('id').values_list('id', 'title', 'explanation')
+        with primary():
+            for obj_id, title, explanation in rows.iterator():
+                entries.append([kind, obj_id, title, plain_text(explanation)[:SNIPPET_LENGTH]])
+    return entries
+
+
+def write_file(path, data):
+    # Written aside under a name of its own and renamed, so nobody ever
+    # reads half a file, even with two workers writing the same one
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def build_level(level):
+    """Write the index file of one level if its content changed, returns its name"""
+    data = json.dumps(
+        {'level': level.level, 'items': level_entries(level)},
+        separators=(',', ':'), ensure_ascii=False,
+    ).encode()
+    name = f'{INDEX_DIR}/level-{level.level}.{hashlib.md5(data).hexdigest()[:12]}.json'
+    path = staticfiles_storage.path(name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file(f'{path}.gz', Compressor.compress_gzip(data))
+        if brotli_installed:
+            write_file(f'{path}.br', Compressor.compress_brotli(data))
+        write_file(path, data)
+        prune(level.level)
+    register(level.level, name)
+    return name
+
+
+def register(level_num, name):
+    cache.set(NAME_CACHE_KEY.format(level=level_num), name, None)
+    # Also record it in the manifest when the manifest storage is in use
+    if hasattr(staticfiles_storage, 'hashed_files'):
+        with manifest_lock():
+            paths, _ = staticfiles_storage.load_manifest()
+            paths[staticfiles_storage.hash_key(f'{INDEX_DIR}/level-{level_num}.json')] = name
+            save_manifest(paths)
+
+
+@contextmanager
+def manifest_lock():
+    """Serialize read-modify-write of the manifest across workers"""
+    path = staticfiles_storage.manifest_storage.path(f'{staticfiles_storage.manifest_name}.lock')
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_manifest(paths):
+    # ManifestFilesMixin.save_manifest() deletes the file before writing the
+    # new one, so a worker starting in between would find no manifest
+    storage = staticfiles_storage
+    storage.hashed_files = paths
+    storage.manifest_hash = storage.file_hash(None, ContentFile(json.dumps(sorted(paths.items())).encode()))
+    payload = {'paths': paths, 'version': storage.manifest_version, 'hash': storage.manifest_hash}
+    write_file(storage.manifest_storage.path(storage.manifest_name), json.dumps(payload).encode())
+
+
+def level_files(level_num):
+    """Names of a level's index files on disk, newest first"""
+    directory = staticfiles_storage.path(INDEX_DIR)
+    try:
+        names = [
+            name for name in os.listdir(directory)
+            if (match := NAME_RE.match(name)) and int(match.group(1)) == level_num
+        ]
+    except FileNotFoundError:
+        return []
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    return names
+
+
+def prune(level_num):
+    """Delete all but the newest few files of a level"""
+    directory = staticfiles_storage.path(INDEX_DIR)
+    for name in level_files(level_num)[KEEP_FILES:]:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(directory, name + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def build():
+    """Rebuild every level, returns level number -> file name"""
+    return {level.level: build_level(level) for level in levels.all_levels()}
+
+
+def rebuild_levels(level_ids):
+    """Rebuild the given levels once the current transaction commits"""
+    def run():
+        for level in levels.all_levels():
+            # A deleted level has nothing left to index
+            if level.id in level_ids:
+                build_level(level)
+    transaction.on_commit(run)
+
+
+def asset_urls():
+    """Level number -> URL of its current index file.
+
+    Levels whose file was never built are left out rather than built here,
+    in the middle of a request; search_api still finds their items.
+    """
+    all_levels = levels.all_levels()
+    keys = {level.level: NAME_CACHE_KEY.format(level=level.level) for level in all_levels}
+    names = cache.get_many(keys.values())
+    urls = {}
+    for level in all_levels:
+        name = names.get(keys[level.level])
+        # The cache may outlive the files, e.g. across deploys
+        if name is None or not os.path.exists(staticfiles_storage.path(name)):
+            files = level_files(level.level)
+            if not files:
+                continue
+            name = f'{INDEX_DIR}/{files[0]}'
+            cache.set(keys[level.level], name, None)
+        urls[level.level] = urljoin(settings.STATIC_URL, name)
+    return urls
+
+
+def asset_path(name):
+    """Path of a built index file, None for names that are not one"""
+    if not NAME_RE.match(name):
+        return None
+    return staticfiles_storage.path(f'{INDEX_DIR}/{name}')
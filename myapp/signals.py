@@ -1,18 +1,259 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProgress, DifficultyLevel
+from .models import UserProgress, DifficultyLevel, Term, RuleTheory, Problem, TestQuestion
+from . import analytics, bitsets, catalog, fuzzy, levels, placement, progression, recording, search, search_assets, snapshots, stats
+from .routers import pin_to_primary
 
 @receiver(post_save, sender=User)
-def create_user_progress(sender, instance, created, **kwargs):
-    if created:
-        # Create level 1 if it doesn't exist
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
+def create_user_progress(sender, instance, created, raw=False, **kwargs):
+    # Only new users need work here, so logins (last_login saves) cost nothing.
+    # Users that predate this signal get their progress lazily in the views.
+    if created and not raw:
+        level_1 = levels.get_level(1)
         UserProgress.objects.create(user=instance, current_level=level_1)
 
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_delete, sender=RuleTheory)
+@receiver(post_save, sender=DifficultyLevel)
+def invalidate_search_index(sender, **kwargs):
+    # Rebuilt lazily on the next search
+    search.index.invalidate()
+
+@receiver(post_save, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+def update_fuzzy_title(sender, instance, **kwargs):
+    kind = 'term' if sender is Term else 'rule'
+    fuzzy.matcher.update(kind, instance.id, instance.title, instance.difficulty.level)
+
+@receiver(post_delete, sender=Term)
+@receiver(post_delete, sender=RuleTheory)
+def remove_fuzzy_title(sender, instance, **kwargs):
+    kind = 'term' if sender is Term else 'rule'
+    fuzzy.matcher.remove(kind, instance.id)
+
+@receiver(post_save, sender=DifficultyLevel)
+def invalidate_fuzzy_titles(sender, **kwargs):
+    # Levels are cached next to the titles
+    fuzzy.matcher.invalidate()
+
+@receiver(m2m_changed, sender=UserProgress.terms_studied.through)
+@receiver(m2m_changed, sender=UserProgress.rules_studied.through)
+@receiver(m2m_changed, sender=UserProgress.problems_solved.through)
+def update_progress_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    field = next(f for f in UserProgress.COUNTER_FIELDS if getattr(UserProgress, f).through is sender)
+    counter = UserProgress.COUNTER_FIELDS[field]
+    content_type = next(t for t, f in recording.STUDIED_FIELDS.items() if f == field)
+    
+    # add() inserts with ignore_conflicts, so when two requests add the same
+    # item at once both see it in pk_set while only one row goes in. The
+    # counters are recounted from the through table rather than bumped by
+    # len(pk_set).
+    if not reverse:
+        # progress.terms_studied.add(...) / remove(...) / clear()
+        if action in ('post_add', 'post_remove', 'post_clear') and (pk_set or action == 'post_clear'):
+            UserProgress.recount(UserProgress.objects.filter(pk=instance.pk))
+            instance.refresh_from_db(fields=[counter])
+            snapshots.invalidate(instance.user_id)
+        if action in ('post_remove', 'post_clear') and (pk_set or action == 'post_clear'):
+            # Removed items have to come round again
+            progression.unstudy(content_type, [instance.pk], pk_set if action == 'post_remove' else None)
+            if recording.writes_bitsets():
+                slots = None
+                if action == 'post_remove':
+                    slots = {}
+                    model = UserProgress._meta.get_field(field).related_model
+                    for level_id, slot in model.objects.filter(pk__in=pk_set).values_list('difficulty_id', 'slot'):
+                        slots.setdefault(level_id, []).append(slot)
+                bitsets.discard([instance.pk], content_type, slots)
+        return
+    
+    # term.userprogress_set.add(...) - pk_set holds UserProgress ids
+    if action == 'post_add' and pk_set:
+        UserProgress.recount(UserProgress.objects.filter(pk__in=pk_set))
+        snapshots.invalidate_all()
+    elif action in ('pre_remove', 'pre_clear'):
+        # Remember who is affected before the rows disappear
+        affected = UserProgress.objects.filter(**{field: instance})
+        if pk_set is not None:
+            affected = affected.filter(pk__in=pk_set)
+        instance._progress_to_recount = list(affected.values_list('pk', flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        pks = getattr(instance, '_progress_to_recount', [])
+        if pks:
+            UserProgress.recount(UserProgress.objects.filter(pk__in=pks))
+            progression.unstudy(content_type, pks, [instance.pk])
+            if recording.writes_bitsets():
+                bitsets.discard(pks, content_type, {instance.difficulty_id: [instance.slot]})
+            snapshots.invalidate_all()
+
+@receiver(pre_delete, sender=Term)
+@receiver(pre_delete, sender=RuleTheory)
+@receiver(pre_delete, sender=Problem)
+def discount_deleted_content(sender, instance, **kwargs):
+    # Cascade deletes of through rows don't send m2m_changed
+    field = {Term: 'terms_studied', RuleTheory: 'rules_studied', Problem: 'problems_solved'}[sender]
+    counter = UserProgress.COUNTER_FIELDS[field]
+    if UserProgress.objects.filter(**{field: instance}).update(**{counter: Greatest(F(counter) - 1, 0)}):
+        snapshots.invalidate_all()
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_delete, sender=RuleTheory)
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def refresh_level_totals(sender, **kwargs):
+    DifficultyLevel.refresh_totals()
+    # The registry holds the totals too
+    levels.invalidate()
+
+@receiver(post_save, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_save, sender=Problem)
+def rewind_content_cursors(sender, instance, **kwargs):
+    # Only an item moved to another level can land behind cursors there;
+    # edits in place and new items (higher ids) leave them alone
+    old_level_id = getattr(instance, '_old_difficulty_id', None)
+    if old_level_id not in (None, instance.difficulty_id):
+        content_type = {Term: 'term', RuleTheory: 'rule', Problem: 'problem'}[sender]
+        progression.rewind_cursors(content_type, instance)
+
+@receiver(pre_save, sender=Term)
+@receiver(pre_save, sender=RuleTheory)
+@receiver(pre_save, sender=Problem)
+@receiver(pre_delete, sender=Term)
+@receiver(pre_delete, sender=RuleTheory)
+@receiver(pre_delete, sender=Problem)
+def pin_content_writes(sender, **kwargs):
+    # The receivers below read the row and its level before it is written,
+    # a lagging replica would hand them the old values
+    pin_to_primary()
+
+@receiver(pre_save, sender=Term)
+@receiver(pre_save, sender=RuleTheory)
+@receiver(pre_save, sender=Problem)
+def remember_old_level(sender, instance, **kwargs):
+    # An item moved to another level makes both catalogs stale
+    instance._old_difficulty_id = None
+    instance._old_slot = None
+    if instance.pk:
+        instance._old_difficulty_id, instance._old_slot = sender.objects.filter(pk=instance.pk).values_list(
+            'difficulty_id', 'slot'
+        ).first() or (None, None)
+
+@receiver(pre_save, sender=Term)
+@receiver(pre_save, sender=RuleTheory)
+@receiver(pre_save, sender=Problem)
+def assign_slot(sender, instance, raw=False, **kwargs):
+    # New and moved items take the next free bit of their level
+    instance._slot_assigned = False
+    if raw and instance.slot is not None:
+        return
+    if instance.slot is None or instance._old_difficulty_id not in (None, instance.difficulty_id):
+        instance.slot = bitsets.next_slot(sender, instance.difficulty_id)
+        # Lets SlottedContent.save() retry if someone else got it first
+        instance._slot_assigned = True
+
+@receiver(post_save, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_save, sender=Problem)
+def move_studied_bit(sender, instance, **kwargs):
+    old_level_id = getattr(instance, '_old_difficulty_id', None)
+    if recording.writes_bitsets() and old_level_id not in (None, instance.difficulty_id):
+        content_type = {Term: 'term', RuleTheory: 'rule', Problem: 'problem'}[sender]
+        bitsets.move_slot(content_type, old_level_id, instance._old_slot, instance.difficulty_id, instance.slot)
+
+@receiver(pre_delete, sender=Term)
+@receiver(pre_delete, sender=RuleTheory)
+@receiver(pre_delete, sender=Problem)
+def clear_studied_bit(sender, instance, **kwargs):
+    if recording.writes_bitsets() and instance.slot is not None:
+        content_type = {Term: 'term', RuleTheory: 'rule', Problem: 'problem'}[sender]
+        bitsets.remove_slot(
+            content_type, instance.difficulty_id, instance.slot, update_counters=recording.reads_bitsets()
+        )
+        snapshots.invalidate_all()
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_delete, sender=RuleTheory)
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def invalidate_catalog(sender, instance, **kwargs):
+    level_ids = {instance.difficulty_id, getattr(instance, '_old_difficulty_id', None)}
+    for level_id in level_ids - {None}:
+        catalog.bump_version(level_id)
+
+@receiver(post_save, sender=Term)
+@receiver(post_delete, sender=Term)
+@receiver(post_save, sender=RuleTheory)
+@receiver(post_delete, sender=RuleTheory)
+def rebuild_search_assets(sender, instance, **kwargs):
+    level_ids = {instance.difficulty_id, getattr(instance, '_old_difficulty_id', None)}
+    search_assets.rebuild_levels(level_ids - {None})
+
+@receiver(post_save, sender=DifficultyLevel)
+def invalidate_level_catalog(sender, instance, **kwargs):
+    catalog.bump_version(instance.pk)
+
+@receiver(post_save, sender=TestQuestion)
+@receiver(post_delete, sender=TestQuestion)
+def invalidate_answer_key(sender, **kwargs):
+    placement.invalidate_answer_key()
+
+@receiver(post_save, sender=DifficultyLevel)
+@receiver(post_delete, sender=DifficultyLevel)
+def invalidate_level_registry(sender, **kwargs):
+    levels.invalidate()
+
+@receiver(post_save, sender=User)
+def count_new_learner(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.LEARNERS)
+
+@receiver(post_delete, sender=User)
+def discount_learner(sender, instance, **kwargs):
+    stats.increment(stats.LEARNERS, -1)
+
+@receiver(pre_save, sender=UserProgress)
+def remember_old_current_level(sender, instance, update_fields=None, **kwargs):
+    instance._old_level_id = None
+    if instance.pk and (update_fields is None or 'current_level' in update_fields):
+        instance._old_level_id = UserProgress.objects.filter(pk=instance.pk).values_list(
+            'current_level_id', flat=True
+        ).first()
+
+@receiver(post_save, sender=UserProgress)
+def count_learners_per_level(sender, instance, created, **kwargs):
+    new_level = levels.get_level_by_id(instance.current_level_id).level
+    if created:
+        stats.increment(stats.level_counter(new_level))
+        return
+    old_level_id = getattr(instance, '_old_level_id', None)
+    if old_level_id is not None and old_level_id != instance.current_level_id:
+        old_level = levels.get_level_by_id(old_level_id).level
+        stats.increment(stats.level_counter(old_level), -1)
+        stats.increment(stats.level_counter(new_level))
+        analytics.record(instance.pk, [analytics.moved(old_level, new_level)])
+
+@receiver(post_delete, sender=UserProgress)
+def discount_learner_level(sender, instance, **kwargs):
+    level = levels.get_level_by_id(instance.current_level_id).level
+    stats.increment(stats.level_counter(level), -1)
+
+@receiver(post_save, sender=UserProgress)
+@receiver(post_delete, sender=UserProgress)
+def invalidate_progress_snapshot(sender, instance, **kwargs):
+    snapshots.invalidate(instance.user_id)
+
 @receiver(post_save, sender=User)
-def save_user_progress(sender, instance, **kwargs):
-    # Ensure UserProgress exists for existing users
-    if not hasattr(instance, 'userprogress'):
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-        UserProgress.objects.create(user=instance, current_level=level_1)
\ No newline at end of file
+@receiver(post_delete, sender=User)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    # Also covers password changes and deactivation
+    snapshots.invalidate(instance.pk)
@@ -0,0 +1,153 @@
+"""A small copy of the learner's user row and progress kept in the session.
+
+With a cache or signed-cookie SESSION_ENGINE reading the session costs no
+query, so pages that only show the learner's level and counters (the
+dashboard) render from this copy without touching the database. A snapshot
+records the learner's token and a site-wide token from the cache as they
+were when it was taken. Writes delete the tokens once they commit (see
+myapp/signals.py and myapp/recording.py), after which the snapshot no longer
+matches and is rebuilt from the database on the next request.
+"""
+import uuid
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .levels import attach_level, get_level
+from .models import UserProgress
+
+SNAPSHOT_SESSION_KEY = 'progress_snapshot'
+USER_TOKEN_KEY = 'snapshot:user:{user_id}'
+ALL_TOKEN_KEY = 'snapshot:all'
+
+# Fields copied into the snapshot, everything else loads on first access
+USER_FIELDS = ['id', 'username', 'is_active', 'is_staff', 'is_superuser']
+PROGRESS_FIELDS = [
+    'id', 'user_id', 'current_level_id', 'terms_studied_count', 'rules_studied_count',
+    'problems_solved_count', 'placement_test_taken', 'placement_test_score',
+]
+
+
+def token_keys(user_id):
+    return [USER_TOKEN_KEY.format(user_id=user_id), ALL_TOKEN_KEY]
+
+
+def issue_tokens(keys):
+    """Current tokens of the keys, issuing new ones for keys not in the cache"""
+    tokens = cache.get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        tokens.update(cache.get_many(missing))
+    return [tokens.get(key) for key in keys]
+
+
+def invalidate(user_id):
+    """Drop the learner's snapshot once the current transaction commits"""
+    transaction.on_commit(partial(cache.delete, USER_TOKEN_KEY.format(user_id=user_id)))
+
+
+def invalidate_all():
+    """Drop every snapshot, for writes that touch many learners"""
+    transaction.on_commit(partial(cache.delete, ALL_TOKEN_KEY))
+
+
+def build(model, fields, values):
+    # Like a row loaded with only(), so missing fields are fetched on access
+    # and save() writes back just the fields that were loaded. from_db()
+    # wants the values in the model's field order.
+    given = dict(zip(fields, values))
+    attnames = [f.attname for f in model._meta.concrete_fields if f.attname in given]
+    return model.from_db(DEFAULT_DB_ALIAS, attnames, [given[name] for name in attnames])
+
+
+def load(request):
+    """The request's snapshot if it is still current, otherwise None"""
+    if not hasattr(request, '_progress_snapshot'):
+        request._progress_snapshot = None
+        snapshot = request.session.get(SNAPSHOT_SESSION_KEY)
+        if (
+            snapshot
+            and str(snapshot['user'][0]) == request.session.get(SESSION_KEY)
+            and constant_time_compare(snapshot['hash'], request.session.get(HASH_SESSION_KEY, ''))
+        ):
+            keys = token_keys(snapshot['user'][0])
+            tokens = cache.get_many(keys)
+            if None not in snapshot['tokens'] and [tokens.get(key) for key in keys] == snapshot['tokens']:
+                request._progress_snapshot = snapshot
+    return request._progress_snapshot
+
+
+def snapshot_user(request):
+    snapshot = load(request)
+    if snapshot is not None:
+        return build(User, USER_FIELDS, snapshot['user'])
+    return get_user(request)
+
+
+def get_progress(request):
+    """The learner's UserProgress with its level, from the snapshot while it is current.
+
+    Falls back to the database, creating the row for users that predate the
+    post_save signal. A new snapshot is taken on GET/HEAD requests when
+    nothing was written in the meantime; other requests write, which would
+    throw it away again. Staff are never snapshotted, the admin works on
+    their rows, and neither is anyone with database sessions, where saving
+    the snapshot costs more than the two reads it saves. Returns None for
+    anonymous users.
+    """
+    if not request.user.is_authenticated:
+        return None
+    snapshot = load(request)
+    if snapshot is not None:
+        return attach_level(build(UserProgress, PROGRESS_FIELDS, snapshot['progress']))
+
+    user = request.user
+    keys = token_keys(user.pk)
+    # Tokens are read before and after the query: if they differ, a write
+    # committed in between and what was read may already be stale
+    before = None
+    if request.method in ('GET', 'HEAD') and not user.is_staff and not settings.SESSION_ENGINE.endswith('db'):
+        before = issue_tokens(keys)
+    user_progress, created = UserProgress.objects.get_or_create(user=user, defaults={'current_level': get_level(1)})
+    attach_level(user_progress)
+    if before is not None and not created:
+        tokens = cache.get_many(keys)
+        if [tokens.get(key) for key in keys] == before:
+            request.session[SNAPSHOT_SESSION_KEY] = {
+                'user': [getattr(user, field) for field in USER_FIELDS],
+                'progress': [getattr(user_progress, field) for field in PROGRESS_FIELDS],
+                'hash': request.session.get(HASH_SESSION_KEY, ''),
+                'tokens': before,
+            }
+    return user_progress
+
+
+class ProgressMiddleware:
+    """Lazy request.user and request.progress, from the snapshot while it is current.
+
+    Goes after AuthenticationMiddleware. Nothing is loaded until a view
+    touches them, and then only once per request. request.progress is meant
+    for views behind login_required.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.user = SimpleLazyObject(partial(snapshot_user, request))
+        request.progress = SimpleLazyObject(partial(get_progress, request))
+        return self.get_response(request)
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from .models import SiteCounter, UserProgress
+from .progression import MAX_LEVEL
+
+LEARNERS = 'learners'
+LEVEL_LEARNERS = 'learners_level_{level}'
+
+STATS_CACHE_KEY = 'site:stats'
+# Public numbers may lag this many seconds behind
+STATS_CACHE_SECONDS = 30
+
+
+def increment(name, delta=1):
+    if not SiteCounter.objects.filter(name=name).update(value=F('value') + delta):
+        # First use of this counter
+        SiteCounter.objects.get_or_create(name=name)
+        SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def level_counter(level_num):
+    return LEVEL_LEARNERS.format(level=level_num)
+
+
+def get_site_stats():
+    """Learner total and learners per level, read from the counters table"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        values = dict(SiteCounter.objects.values_list('name', 'value'))
+        stats = {
+            'learners': values.get(LEARNERS, 0),
+            'levels': {
+                level_num: values.get(level_counter(level_num), 0)
+                for level_num in range(1, MAX_LEVEL + 1)
+            },
+        }
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_SECONDS)
+    return stats
+
+
+def reconcile():
+    """Recount every counter from the real tables, returns the new stats"""
+    counts = {LEARNERS: User.objects.count()}
+    for level_num in range(1, MAX_LEVEL + 1):
+        counts[level_counter(level_num)] = 0
+    per_level = UserProgress.objects.values('current_level__level').annotate(n=Count('id')).order_by()
+    for row in per_level:
+        counts[level_counter(row['current_level__level'])] = row['n']
+
+    for name, value in counts.items():
+        SiteCounter.objects.update_or_create(name=name, defaults={'value': value})
+    cache.delete(STATS_CACHE_KEY)
+    return get_site_stats()
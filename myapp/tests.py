@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from .fuzzy import FuzzyMatcher
+from .models import DifficultyLevel, PlacementSubmission, Term, TestQuestion
+from .placement import MAX_QUESTIONS
+
+
+class AdaptivePlacementTestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for level_num in range(1, 6):
+            level, _ = DifficultyLevel.objects.get_or_create(level=level_num)
+            for i in range(4):
+                TestQuestion.objects.create(
+                    question=f'Q{level_num}-{i}', option_a='a', option_b='b', option_c='c', option_d='d',
+                    correct_answer='A', explanation='x', difficulty=level,
+                )
+        self.user = User.objects.create_user('learner', password='pw')
+        self.client.force_login(self.user)
+
+    def test_answers_follow_on_after_restart(self):
+        url = reverse('adaptive_placement_test')
+        response = self.client.get(f'{url}?restart=1')
+        self.assertRedirects(response, url)
+
+        response = self.client.get(url)
+        self.assertContains(response, f'action="{url}"')
+        for number in range(1, MAX_QUESTIONS + 1):
+            self.assertEqual(response.context['question_number'], number)
+            question = response.context['questions'][0]
+            response = self.client.post(url, {f'question_{question.id}': 'A'}, follow=True)
+            if 'questions' not in response.context:
+                break
+        self.assertGreater(number, 1)
+        self.assertTrue(PlacementSubmission.objects.filter(user_progress__user=self.user, adaptive=True).exists())
+
+
+class FuzzyMatcherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.level, _ = DifficultyLevel.objects.get_or_create(level=1)
+        self.term = Term.objects.create(title='Supply', explanation='x', difficulty=self.level)
+
+    def titles(self, matcher, query):
+        return [hit['title'] for hit in matcher.search(query, {'term'})]
+
+    def test_other_workers_replay_committed_changes(self):
+        worker = FuzzyMatcher()
+        self.titles(worker, 'supply')
+        built = worker.version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.term.title = 'Zebra crossing'
+            self.term.save()
+        self.assertEqual(self.titles(worker, 'zebra crossing'), ['Zebra crossing'])
+        self.assertEqual(worker.version, built + 1)
+
+    def test_rolled_back_save_changes_nothing(self):
+        worker = FuzzyMatcher()
+        self.titles(worker, 'supply')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.term.title = 'Phantom yak'
+                    self.term.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.titles(worker, 'phantom yak'), [])
@@ -0,0 +1,54 @@
+"""Token buckets kept in the cache, used to slow down login and sign-up floods.
+
+A bucket holds up to `burst` tokens and gains `per_minute` of them back
+every minute; each attempt takes one. Buckets must live in a cache every
+worker shares, or each worker counts on its own and the limits multiply by
+the number of workers (check myapp.E001 refuses a per-process cache with
+several workers). Reading and writing a bucket is not atomic, so two
+workers racing for the last token may both get it, which is fine for a
+limit meant to keep password hashing from eating every worker.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+BUCKET_KEY = 'throttle:{scope}:{ident}'
+
+
+def client_ip(request):
+    """The client's address, looking past TRUSTED_PROXIES proxies"""
+    proxies = settings.TRUSTED_PROXIES
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def bucket(scope, ident, rate, now):
+    """The bucket's key and how many tokens it holds at `now`"""
+    burst, per_minute = rate
+    # Usernames can hold anything, keys for memcached can't
+    key = BUCKET_KEY.format(scope=scope, ident=hashlib.md5(ident.encode()).hexdigest())
+    tokens, updated = cache.get(key, (burst, now))
+    return key, min(burst, tokens + (now - updated) * per_minute / 60)
+
+
+def wait(scope, ident, rate):
+    """Seconds until the bucket has a token, 0 if it has one; takes nothing"""
+    key, tokens = bucket(scope, ident, rate, time.time())
+    return 0 if tokens >= 1 else (1 - tokens) * 60 / rate[1]
+
+
+def take(scope, ident, rate):
+    """Take one token, returns 0 if there was one, else seconds until there is"""
+    burst, per_minute = rate
+    now = time.time()
+    key, tokens = bucket(scope, ident, rate, now)
+    if tokens < 1:
+        return (1 - tokens) * 60 / per_minute
+    # Kept only as long as it takes to fill up again
+    cache.set(key, (tokens - 1, now), int((burst - tokens + 1) * 60 / per_minute) + 1)
+    return 0
@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, search_assets, views
+
+# Async versions of the per-click endpoints when running under ASGI
+progress_views = async_views if settings.ASYNC_PROGRESS_ENDPOINTS else views
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -9,10 +13,20 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('start-from-zero/', views.start_from_zero, name='start_from_zero'),
     path('placement-test/', views.placement_test, name='placement_test'),
+    path('placement-test/adaptive/', views.adaptive_placement_test, name='adaptive_placement_test'),
     path('learning-content/', views.learning_content, name='learning_content'),
-    path('mark-term-studied/<int:term_id>/', views.mark_term_studied, name='mark_term_studied'),
-    path('mark-rule-studied/<int:rule_id>/', views.mark_rule_studied, name='mark_rule_studied'),
-    path('check-problem-answer/<int:problem_id>/', views.check_problem_answer, name='check_problem_answer'),
+    path('mark-term-studied/<int:term_id>/', progress_views.mark_term_studied, name='mark_term_studied'),
+    path('mark-rule-studied/<int:rule_id>/', progress_views.mark_rule_studied, name='mark_rule_studied'),
+    path('check-problem-answer/<int:problem_id>/', progress_views.check_problem_answer, name='check_problem_answer'),
+    path('progress/events/', views.progress_events, name='progress_events'),
+    path('analytics/', views.learning_analytics, name='learning_analytics'),
     path("search/", views.search, name="search"),
+    path("search/api/", views.search_api, name="search_api"),
+    path("search/item/<str:kind>/<int:obj_id>/", views.search_item, name="search_item"),
+    # Same URL WhiteNoise serves the file under, for files newer than the worker
+    path(f"{settings.STATIC_URL.strip('/')}/{search_assets.INDEX_DIR}/<str:name>",
+         views.search_index_asset, name="search_index_asset"),
+    path("stats/", views.site_stats_api, name="site_stats"),
+    path("metrics/", views.metrics, name="metrics"),
 
 ]
\ No newline at end of file
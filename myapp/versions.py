@@ -0,0 +1,74 @@
+"""Version numbers in the shared cache that tell workers to reload.
+
+Within a request each version is read from the cache once and then
+remembered (VersionMemoMiddleware), so the level registry, the catalogs and
+the search indexes checking the same keys over and over cost one cache read
+per key. Outside requests every check goes to the cache.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+
+# key -> version, for the request being served
+_memo = ContextVar('versions_memo', default=None)
+
+
+def get_version(key):
+    memo = _memo.get()
+    if memo is None:
+        return cache.get(key, 0)
+    if key not in memo:
+        memo[key] = cache.get(key, 0)
+    return memo[key]
+
+
+async def aget_version(key):
+    memo = _memo.get()
+    if memo is None:
+        return await cache.aget(key, 0)
+    if key not in memo:
+        memo[key] = await cache.aget(key, 0)
+    return memo[key]
+
+
+def bump_version(key):
+    """Move a version number on so every worker sharing the cache reloads"""
+    cache.add(key, 0, timeout=None)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+        version = 1
+    memo = _memo.get()
+    if memo is not None:
+        memo[key] = version
+    return version
+
+
+class VersionMemoMiddleware:
+    """Remember the versions read during a request, goes near the top"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _memo.reset(token)
+
+    async def __acall__(self, request):
+        token = _memo.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _memo.reset(token)
@@ -1,63 +1,125 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.forms import UsernameField
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.core.exceptions import ObjectDoesNotExist
 from .models import (
     DifficultyLevel, Term, RuleTheory, Problem, 
-    TestQuestion, UserProgress
+    TestQuestion, UserProgress, PlacementSubmission
 )
+from .catalog import current_version, find_item
+from .fuzzy import VERSION_KEY as FUZZY_VERSION_KEY, matcher as fuzzy_matcher
+from .metrics import merged_snapshot, render_prometheus
+from .levels import get_level
+from .placement import AdaptiveTest, answers_from_post, get_answer_key, grade, level_for_score, score_percentage
+from .progression import next_content
+from .recording import parse_events, record, record_answer, record_events
+from . import analytics, hashing, throttle
+from .search import SEARCH_MODELS, VERSION_KEY as SEARCH_VERSION_KEY, run_search, fuzzy_search
+from . import search_assets
+from .stats import get_site_stats
+from .versions import get_version
+import hashlib
+import json
 import random
 
+# Same as WhiteNoise gives files with a hash in their name
+ASSET_CACHE_SECONDS = 60 * 60 * 24 * 365 * 10
+
+
+def make_etag(*parts):
+    """Quoted ETag over the given values and the running release"""
+    digest = hashlib.sha1(repr((settings.RELEASE,) + parts).encode()).hexdigest()
+    return f'"{digest}"'
+
 def index(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
     
-    user_count = User.objects.count()
+    site_stats = get_site_stats()
     
-    return render(request, 'myapp/index.html', {"user_count": user_count})
+    return render(request, 'myapp/index.html', {
+        "user_count": site_stats['learners'],
+        "site_stats": site_stats
+    })
 
 
 
+def auth_refused(request, template, error, status, retry_after):
+    response = render(request, template, {'error': error}, status=status)
+    response.headers['Retry-After'] = str(max(int(retry_after + 0.5), 1))
+    return response
+
+
 def register_view(request):
     if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
+        # Cleaned like the sign-up form and import_learners do
+        username = UsernameField().to_python(request.POST.get('username'))
+        password = request.POST.get('password', '')
+        
+        if not username or not password:
+            return render(request, 'myapp/register.html', {'error': 'Enter a username and a password'})
+        
+        wait = throttle.take('register-ip', throttle.client_ip(request), settings.REGISTER_RATE_PER_IP)
+        if wait:
+            return auth_refused(request, 'myapp/register.html', 'Too many sign-ups, try again later', 429, wait)
         
         if User.objects.filter(username=username).exists():
             return render(request, 'myapp/register.html', {'error': 'Username already exists'})
         
-        # Create user
-        user = User.objects.create_user(username=username, password=password)
+        try:
+            password_hash = hashing.hash_password(password)
+        except hashing.Busy:
+            return auth_refused(request, 'myapp/register.html', 'Server is busy, try again in a moment', 503, 1)
         
-        # Authenticate user immediately after creation
-        user = authenticate(request, username=username, password=password)
-        if user is not None:
-            login(request, user)  # logs in user and sets session properly
-
-            # Initialize UserProgress
-            level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-            UserProgress.objects.get_or_create(user=user, defaults={'current_level': level_1})
-            
-            return redirect('dashboard')
-        else:
-            return render(request, 'myapp/register.html', {'error': 'Authentication failed. Try again.'})
+        # Create user, the post_save signal gives them their progress
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=username, password=password_hash)
+        except IntegrityError:
+            # Taken between the check above and now
+            return render(request, 'myapp/register.html', {'error': 'Username already exists'})
+        
+        # The password was hashed just now, no need to verify it again
+        login(request, user, backend=hashing.BACKEND)
+        return redirect('dashboard')
     
     return render(request, 'myapp/register.html')
 
 
 def login_view(request):
     if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
+        username = request.POST.get('username', '')
+        password = request.POST.get('password', '')
+        
+        # Checked before any hashing, so a flood is turned away cheaply. Only
+        # failed logins count against a username, and only from the address
+        # they came from, so nobody can lock a learner out of their account.
+        ip = throttle.client_ip(request)
+        user_bucket = ('login-user', f'{username.lower()} {ip}', settings.LOGIN_RATE_PER_USERNAME)
+        wait = throttle.wait(*user_bucket) or throttle.take('login-ip', ip, settings.LOGIN_RATE_PER_IP)
+        if wait:
+            return auth_refused(request, 'myapp/login.html', 'Too many attempts, try again later', 429, wait)
         
-        user = authenticate(request, username=username, password=password)
+        try:
+            user = hashing.check_credentials(username, password)
+        except hashing.Busy:
+            return auth_refused(request, 'myapp/login.html', 'Server is busy, try again in a moment', 503, 1)
         if user is not None:
-            login(request, user)
+            login(request, user, backend=hashing.BACKEND)
             return redirect('dashboard')
         else:
+            throttle.take(*user_bucket)
             return render(request, 'myapp/login.html', {'error': 'Invalid credentials'})
     
     return render(request, 'myapp/login.html')
@@ -71,17 +133,9 @@ def logout_view(request):
 
 @login_required
 def dashboard(request):
-    user_progress, created = UserProgress.objects.get_or_create(
-        user=request.user,
-        defaults={'current_level': DifficultyLevel.objects.get_or_create(level=1)[0]}
-    )
-
-    has_started_learning = (
-        user_progress.placement_test_taken or
-        user_progress.terms_studied.exists() or
-        user_progress.rules_studied.exists() or
-        user_progress.problems_solved.exists()
-    )
+    # Served from the session snapshot when nothing changed since it was taken
+    user_progress = request.progress
+    has_started_learning = user_progress.has_started_learning
 
     return render(request, "myapp/dashboard.html", {
         "user_progress": user_progress,
@@ -91,80 +145,22 @@ def dashboard(request):
 
 @login_required
 def start_from_zero(request):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        # Create user progress if it doesn't exist
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-        user_progress = UserProgress.objects.create(user=request.user, current_level=level_1)
-        
+    user_progress = request.progress
     
-    level_1, created = DifficultyLevel.objects.get_or_create(level=1)
+    level_1 = get_level(1)
     user_progress.current_level = level_1
     user_progress.placement_test_taken = False
     user_progress.placement_test_score = 0
-    user_progress.save()
+    user_progress.save(update_fields=['current_level', 'placement_test_taken', 'placement_test_score'])
     
     return redirect('learning_content')
 
 @login_required
 def learning_content(request):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        # Create user progress if it doesn't exist
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-        user_progress = UserProgress.objects.create(user=request.user, current_level=level_1)
-    
-    current_level = user_progress.current_level
-    
-    # Get content based on progression logic
-    terms_studied_count = user_progress.terms_studied.count()
-    rules_studied_count = user_progress.rules_studied.count()
-    
-    # Determine what to show next based on progression logic
-    if terms_studied_count % 5 == 0 and terms_studied_count > 0 and rules_studied_count < (terms_studied_count // 5):
-        # Show a rule/theory after every 5 terms
-        content_type = 'rule'
-        content = RuleTheory.objects.filter(difficulty=current_level).exclude(
-            id__in=user_progress.rules_studied.all()
-        ).first()
-    elif (terms_studied_count % 10 == 0 and terms_studied_count > 0 and 
-          rules_studied_count % 2 == 0 and rules_studied_count > 0):
-        # Show a problem after every 10 terms and 2 rules
-        content_type = 'problem'
-        content = Problem.objects.filter(difficulty=current_level).exclude(
-            id__in=user_progress.problems_solved.all()
-        ).first()
-    else:
-        # Show a term by default
-        content_type = 'term'
-        content = Term.objects.filter(difficulty=current_level).exclude(
-            id__in=user_progress.terms_studied.all()
-        ).first()
+    user_progress = request.progress
     
-    # If no content of the determined type, try other types
-    if not content:
-        if content_type == 'term':
-            content = RuleTheory.objects.filter(difficulty=current_level).exclude(
-                id__in=user_progress.rules_studied.all()
-            ).first()
-            content_type = 'rule' if content else None
-        
-        if not content:
-            content = Problem.objects.filter(difficulty=current_level).exclude(
-                id__in=user_progress.problems_solved.all()
-            ).first()
-            content_type = 'problem' if content else None
-    
-    # If still no content, check if user can progress to next level
-    if not content:
-        next_level_num = current_level.level + 1
-        if next_level_num <= 5:
-            next_level, created = DifficultyLevel.objects.get_or_create(level=next_level_num)
-            user_progress.current_level = next_level
-            user_progress.save()
-            return redirect('learning_content')
+    # Moves the learner up a level when the current one is finished
+    content_type, content = next_content(user_progress)
     
     if not content:
         return render(request, 'myapp/learning_content.html', {
@@ -179,56 +175,65 @@ def learning_content(request):
     else:
         template = 'myapp/problem_detail.html'
     
-    return render(request, template, {
-        'content': content,
-        'content_type': content_type,
-        'user_progress': user_progress
-    })
+    content_version = current_version(content.difficulty_id)
+    # The page only changes with the item, the learner and their CSRF secret,
+    # so a browser that already has it gets a 304 without a render
+    etag = make_etag(
+        content_type, content.id, content.updated_at, content_version,
+        request.user.pk, request.META.get('CSRF_COOKIE'),
+    )
+    last_modified = content.updated_at.timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render(request, template, {
+            'content': content,
+            'content_type': content_type,
+            'user_progress': user_progress,
+        })
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 def mark_term_studied(request, term_id):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    user_progress = request.progress
     
     if request.method == 'POST':
-        term = get_object_or_404(Term, id=term_id)
-        user_progress.terms_studied.add(term)
-        user_progress.save()
+        term = find_item('term', term_id, user_progress.current_level_id)
+        if term is None:
+            raise Http404
+        record(user_progress, 'term', term)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'})
 
 @login_required
 def mark_rule_studied(request, rule_id):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    user_progress = request.progress
     
     if request.method == 'POST':
-        rule = get_object_or_404(RuleTheory, id=rule_id)
-        user_progress.rules_studied.add(rule)
-        user_progress.save()
+        rule = find_item('rule', rule_id, user_progress.current_level_id)
+        if rule is None:
+            raise Http404
+        record(user_progress, 'rule', rule)
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'})
 
 @login_required
 def check_problem_answer(request, problem_id):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        return JsonResponse({'status': 'error', 'message': 'User progress not found'})
+    user_progress = request.progress
     
     if request.method == 'POST':
-        problem = get_object_or_404(Problem, id=problem_id)
+        problem = find_item('problem', problem_id, user_progress.current_level_id)
+        if problem is None:
+            raise Http404
         user_answer = request.POST.get('answer', '').upper()
         
         is_correct = user_answer == problem.correct_answer
         
         if is_correct:
-            user_progress.problems_solved.add(problem)
-            user_progress.save()
+            record(user_progress, 'problem', problem)
+        record_answer(user_progress, problem, is_correct)
         
         return JsonResponse({
             'status': 'success',
@@ -240,52 +245,65 @@ def check_problem_answer(request, problem_id):
 
 
 @login_required
-def placement_test(request):
+def progress_events(request):
+    """Record a batch of studied/answered events sent as JSON"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=405)
+    
+    user_progress = request.progress
+    
     try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        # Create user progress if it doesn't exist
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-        user_progress = UserProgress.objects.create(user=request.user, current_level=level_1)
+        payload = json.loads(request.body)
+        events = parse_events(payload.get('events') if isinstance(payload, dict) else None)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    result = record_events(user_progress, events)
+    return JsonResponse({'status': 'success', **result})
+
+
+@login_required
+def placement_test(request):
+    user_progress = request.progress
     
     if request.method == 'POST':
-        # Calculate score
-        questions = TestQuestion.objects.all()
-        total_questions = questions.count()
+        # Grade against the cached answer key, question rows are not loaded
+        answer_key = get_answer_key()
+        total_questions = len(answer_key)
         
         if total_questions == 0:
             return redirect('dashboard')
         
-        correct_answers = 0
-        for question in questions:
-            answer_key = f'question_{question.id}'
-            user_answer = request.POST.get(answer_key, '').upper()
-            
-            if user_answer == question.correct_answer:
-                correct_answers += 1
+        answers = {qid: letter for qid, letter in answers_from_post(request.POST).items() if qid in answer_key}
+        correct_answers, total_questions = grade(answers, answer_key)
+        score = score_percentage(correct_answers, total_questions)
+        level_num = level_for_score(score)
         
-        score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-        
-        # Determine level based on score with proper ranges
-        if score < 20:
-            level_num = 1
-        elif score < 40:
-            level_num = 2
-        elif score < 60:
-            level_num = 3
-        elif score < 80:
-            level_num = 4
-        else:
-            level_num = 5  # Only 80-100% gets level 5
+        PlacementSubmission.objects.create(
+            user_progress=user_progress,
+            answers=answers,
+            question_ids=list(answer_key),
+            correct=correct_answers,
+            total=total_questions,
+            score=score,
+        )
         
         # Update user progress
-        level, created = DifficultyLevel.objects.get_or_create(level=level_num)
+        level = get_level(level_num)
         user_progress.current_level = level
         user_progress.placement_test_taken = True
         user_progress.placement_test_score = score
-        user_progress.save()
+        with transaction.atomic():
+            user_progress.save(update_fields=['current_level', 'placement_test_taken', 'placement_test_score'])
+            analytics.record(user_progress.pk, [analytics.placed(level_num, score)])
         
-        return redirect('learning_content')
+        # Show results page instead of redirecting immediately
+        return render(request, 'myapp/test_results.html', {
+            'score': score,
+            'level': level,
+            'correct': correct_answers,
+            'total': total_questions
+        })
     
     # Get all test questions
     questions = TestQuestion.objects.all()
@@ -297,55 +315,55 @@ def placement_test(request):
     return render(request, 'myapp/placement_test.html', {
         'questions': questions
     })
-    
-    
+
+
+
 @login_required
-def placement_test(request):
-    try:
-        user_progress = UserProgress.objects.get(user=request.user)
-    except UserProgress.DoesNotExist:
-        # Create user progress if it doesn't exist
-        level_1, created = DifficultyLevel.objects.get_or_create(level=1)
-        user_progress = UserProgress.objects.create(user=request.user, current_level=level_1)
+def adaptive_placement_test(request):
+    user_progress = request.progress
     
-    if request.method == 'POST':
-        # Calculate score
-        questions = TestQuestion.objects.all()
-        total_questions = questions.count()
-        
-        if total_questions == 0:
-            return redirect('dashboard')
+    if request.method == 'GET' and request.GET.get('restart'):
+        # Back to the plain URL, so answers are not posted to ?restart=1
+        request.session['adaptive_test'] = AdaptiveTest().state
+        return redirect('adaptive_placement_test')
+    if 'adaptive_test' not in request.session:
+        request.session['adaptive_test'] = AdaptiveTest().state
+    test = AdaptiveTest(request.session['adaptive_test'])
+    
+    if request.method == 'POST' and test.state['current'] is not None:
+        letter = request.POST.get(f"question_{test.state['current']}", '').upper()
+        test.answer(letter)
+        request.session.modified = True
         
-        correct_answers = 0
-        for question in questions:
-            answer_key = f'question_{question.id}'
-            user_answer = request.POST.get(answer_key, '').upper()
-            
-            if user_answer == question.correct_answer:
-                correct_answers += 1
+        if not test.finished:
+            return redirect('adaptive_placement_test')
         
-        score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+        answers = test.answers
+        correct_answers, total_questions = grade(answers, {
+            qid: letter for qid, letter in get_answer_key().items() if qid in answers
+        })
+        score = score_percentage(correct_answers, total_questions)
         
-        # Determine level based on score with proper ranges
-        if score < 20:
-            level_num = 1
-        elif score < 40:
-            level_num = 2
-        elif score < 60:
-            level_num = 3
-        elif score < 80:
-            level_num = 4
-        else:
-            level_num = 5  # Only 80-100% gets level 5
+        PlacementSubmission.objects.create(
+            user_progress=user_progress,
+            answers=answers,
+            question_ids=list(answers),
+            correct=correct_answers,
+            total=total_questions,
+            score=score,
+            adaptive=True,
+        )
+        del request.session['adaptive_test']
         
-        # Update user progress
-        level, created = DifficultyLevel.objects.get_or_create(level=level_num)
+        # Level comes from the ability estimate, not the raw percentage
+        level = get_level(test.level)
         user_progress.current_level = level
         user_progress.placement_test_taken = True
         user_progress.placement_test_score = score
-        user_progress.save()
+        with transaction.atomic():
+            user_progress.save(update_fields=['current_level', 'placement_test_taken', 'placement_test_score'])
+            analytics.record(user_progress.pk, [analytics.placed(test.level, score)])
         
-        # Show results page instead of redirecting immediately
         return render(request, 'myapp/test_results.html', {
             'score': score,
             'level': level,
@@ -353,37 +371,170 @@ def placement_test(request):
             'total': total_questions
         })
     
-    # Get all test questions
-    questions = TestQuestion.objects.all()
-    if not questions.exists():
+    question_id = test.next_question_id()
+    request.session.modified = True
+    if question_id is None:
         return render(request, 'myapp/placement_test.html', {
             'error': 'No test questions available. Please contact administrator.'
         })
     
     return render(request, 'myapp/placement_test.html', {
-        'questions': questions
+        'questions': TestQuestion.objects.filter(pk=question_id),
+        'question_number': test.question_number,
+        'adaptive': True
     })
 
 
 
 
+def search_page_etag(request):
+    # Only the navigation and the index files differ between visits
+    return make_etag('search', request.user.is_authenticated, sorted(search_assets.asset_urls().items()))
 
-def search(request):
 
-    terms = Term.objects.all()
-    rules = RuleTheory.objects.all()
+def search_api_etag(request):
+    # Both versions move on every term, rule or level change
+    return make_etag(
+        get_version(SEARCH_VERSION_KEY), get_version(FUZZY_VERSION_KEY), request.GET.urlencode()
+    )
 
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=search_page_etag)
+def search(request):
+    # The page only links the per-level index files, which give instant
+    # matches while typing; search_api's full-text results replace them
     return render(request, "myapp/search.html", {
+        'index_urls': list(search_assets.asset_urls().values()),
+    })
+
+
+def search_index_asset(request, name):
+    """Serve an index file written after WhiteNoise scanned the static files"""
+    path = search_assets.asset_path(name)
+    if path is None:
+        raise Http404
+    
+    accepted = request.headers.get('Accept-Encoding', '')
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+        if encoding and encoding not in accepted:
+            continue
+        try:
+            with open(path + suffix, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            continue
+        response = HttpResponse(data, content_type='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        # The name changes with the content
+        patch_cache_control(response, public=True, max_age=ASSET_CACHE_SECONDS, immutable=True)
+        return response
+    raise Http404
+
+
+def search_item(request, kind, obj_id):
+    """Full explanation of one search result, loaded when it is opened"""
+    if kind not in SEARCH_MODELS:
+        raise Http404
+    item = SEARCH_MODELS[kind].objects.filter(pk=obj_id).values(
+        'id', 'title', 'explanation', 'difficulty__level', 'updated_at'
+    ).first()
+    if item is None:
+        raise Http404
+    
+    etag = make_etag(kind, item['id'], item['updated_at'])
+    last_modified = item['updated_at'].timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse({
+            'status': 'success',
+            'type': kind,
+            'id': item['id'],
+            'title': item['title'],
+            'level': item['difficulty__level'],
+            'explanation': item['explanation'],
+        })
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=search_api_etag)
+def search_api(request):
+    query = request.GET.get('q', '').strip()
+    kinds = request.GET.getlist('type') or None
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', 20)), 1), 50)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid page'}, status=400)
+
+    total, results = run_search(query, kinds=kinds, page=page, page_size=page_size)
+
+    # Nothing matched exactly, fall back to typo-tolerant title matching
+    did_you_mean = None
+    is_fuzzy = False
+    if total == 0 and query and request.GET.get('fuzzy') == '1':
+        results = fuzzy_search(query, kinds=kinds, limit=page_size)
+        total = len(results)
+        is_fuzzy = True
+        did_you_mean = fuzzy_matcher.did_you_mean(query)
+
+    return JsonResponse({
+        'status': 'success',
+        'query': query,
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'has_next': not is_fuzzy and page * page_size < total,
+        'fuzzy': is_fuzzy,
+        'did_you_mean': did_you_mean,
+        'results': results,
+    })
+
 
-        "terms": terms,
-        "rules": rules
+
+def site_stats_api(request):
+    site_stats = get_site_stats()
+    return JsonResponse({
+        'status': 'success',
+        'learners': site_stats['learners'],
+        'levels': site_stats['levels'],
     })
 
 
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Route names and traffic are not for the public
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    
+    return HttpResponse(
+        render_prometheus(merged_snapshot()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@login_required
+def learning_analytics(request):
+    # Read from the daily rollups only, see myapp/analytics.py
+    user_progress = request.progress
+    
+    return render(request, 'myapp/learning_analytics.html', {
+        'stats': analytics.learner_stats(user_progress),
+        'site': analytics.site_stats() if request.user.is_staff else None,
+    })
 
-from django.contrib.auth.models import User
 
 def base_context(request):
     return {
-        "user_count": User.objects.count()
+        "user_count": get_site_stats()['learners']
     }
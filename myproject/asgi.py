@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Run it with an ASGI server, e.g.
+``gunicorn -k uvicorn.workers.UvicornWorker myproject.asgi``.
 """
 
 import os
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
+# Use the async progress endpoints (myapp/async_views.py) under ASGI
+os.environ.setdefault('ASYNC_PROGRESS_ENDPOINTS', 'True')
 
 application = get_asgi_application()
@@ -26,12 +26,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "myapp.metrics.MetricsMiddleware",
+    "myapp.routers.PrimaryPinMiddleware",
+    "myapp.versions.VersionMemoMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "myapp.snapshots.ProgressMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -40,7 +44,8 @@ ROOT_URLCONF = "myproject.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates that also reports render time to myapp.metrics
+        "BACKEND": "myapp.metrics.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -55,6 +60,42 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "myproject.wsgi.application"
 
+# Serve the progress-recording endpoints with the async views in
+# myapp/async_views.py. myproject/asgi.py turns this on by default.
+ASYNC_PROGRESS_ENDPOINTS = os.environ.get("ASYNC_PROGRESS_ENDPOINTS", "False") == "True"
+
+# Where learners' studied items are stored, see myapp/recording.py:
+# "through" (the M2M tables), "dual" (both, reading the M2M tables) or
+# "bitset" (one StudiedBitset row per learner, level and type). Switch by
+# deploying "dual", running backfill_studied_bitsets, then "bitset".
+STUDIED_STORAGE = os.environ.get("STUDIED_STORAGE", "through")
+
+# Login and sign-up limits per client address and per username, as
+# (burst, tokens back per minute), see myapp/throttle.py
+LOGIN_RATE_PER_IP = (20, 10)
+LOGIN_RATE_PER_USERNAME = (10, 3)
+REGISTER_RATE_PER_IP = (10, 5)
+# Proxies in front of the app that append to X-Forwarded-For. Render runs
+# one and sets RENDER; elsewhere set it, or every client behind the proxy
+# shares one login bucket (see check myapp.W001)
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "1" if os.environ.get("RENDER") else "0"))
+# Threads hashing passwords, and how many more hashes may wait for one
+# before logins and sign-ups are refused with a 503 (myapp/hashing.py)
+PASSWORD_HASHING_THREADS = int(os.environ.get("PASSWORD_HASHING_THREADS", "2"))
+PASSWORD_HASHING_QUEUE = int(os.environ.get("PASSWORD_HASHING_QUEUE", "8"))
+
+# Identifies the deployed code, part of every ETag so a deploy never
+# revalidates pages rendered by the previous release. Render sets this.
+RELEASE = os.environ.get("RENDER_GIT_COMMIT", "")
+
+# Metrics
+# Each worker dumps its request metrics here so /metrics/ can report all of
+# them; leave unset when running a single process.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+# /metrics/ requires "Authorization: Bearer <token>"; without a token it is
+# only served when DEBUG is on
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 # Database
 DATABASES = {
     "default": {
@@ -72,6 +113,36 @@ database_url = os.environ.get("DATABASE_URL")
 if database_url:
     DATABASES["default"] = dj_database_url.parse(database_url)
 
+# Read replicas, comma separated URLs in the DATABASE_URL format. Content
+# reads go to them, see myapp/routers.py. To try it locally with SQLite,
+# point one at a copy of the database file, or at the same file.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.environ.get("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+for i, url in enumerate(REPLICA_DATABASE_URLS, 1):
+    DATABASES[f"replica{i}"] = dict(dj_database_url.parse(url), TEST={"MIRROR": "default"})
+DATABASE_ROUTERS = ["myapp.routers.ReplicaRouter"]
+# Seconds a client keeps reading content from the primary after changing it
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "5"))
+
+# Cache
+# Content versions (catalogs, levels, search indexes), the placement answer
+# key, login throttles and progress snapshots live here, so every worker
+# must see the same cache, and they are read on almost every request, so it
+# should be an in-memory one: with several workers set CACHE_BACKEND to
+# "django.core.cache.backends.redis.RedisCache" and CACHE_LOCATION to e.g.
+# "redis://host:6379/0", or to memcached. The default per-process
+# LocMemCache is only right for a single worker; check myapp.E001 rejects
+# it, and the database and file caches, when WEB_CONCURRENCY asks for more.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+if "CACHE_BACKEND" in os.environ:
+    CACHES = {
+        "default": {
+            "BACKEND": os.environ["CACHE_BACKEND"],
+            "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -90,12 +161,19 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "myapp" / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# Files with a content hash in their name never change, let browsers keep
+# them forever (the search index files of myapp/search_assets.py)
+WHITENOISE_IMMUTABLE_FILE_TEST = r"\.[0-9a-f]{12}\.\w+$"
 
 # Media files
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
 # Sessions
+# "django.contrib.sessions.backends.cache" or ".signed_cookies" make the
+# session free to read, so pages served from the progress snapshot in
+# myapp/snapshots.py need no database at all
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "django.contrib.sessions.backends.db")
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 дней
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 